@@ -0,0 +1,98 @@
+import re
+from collections import Counter
+
+# Аналитика по строкам вакансий: общая для бота и для предрасчёта агрегатов в storage.py
+
+def parse_salary(salary):
+    # Строка вида "from - to currency" из format_salary в hh_parser.py.
+    # Нужна только для переноса старых данных: парсер сохраняет числовые поля сразу.
+    if not salary or salary == 'Не указана':
+        return None, None, None
+    parts = salary.split()
+    if len(parts) < 3:
+        return None, None, None
+    try:
+        from_value = float(parts[0]) if parts[0] != 'None' else None
+        to_value = float(parts[2]) if parts[2] != 'None' else None
+    except ValueError:
+        return None, None, None
+    return from_value, to_value, parts[3] if len(parts) > 3 else None
+
+# Допустимая зарплата, введённая пользователем, руб. в месяц: всё, что вне диапазона, — опечатка
+USER_SALARY_MIN = 10_000
+USER_SALARY_MAX = 10_000_000
+SALARY_MULTIPLIERS = {'к': 1000, 'k': 1000, 'тыс': 1000, 'млн': 1_000_000}
+# Число с разделителями тысяч ('150 000', '150.000') или дробной частью ('1,5') и множителем ('120к', '1,5 млн')
+SALARY_NUMBER = re.compile(
+    r'(?P<integer>\d+(?:[ \u00a0.,]\d{3}(?!\d))*)(?:[.,](?P<fraction>\d{1,2})(?!\d))?'
+    r'\s*(?P<multiplier>тыс|млн|[кk](?![а-яёa-z]))?',
+    re.IGNORECASE
+)
+
+def parse_salary_text(text):
+    # Зарплата, введённая пользователем: 'от 80000 до 120000 руб.', '150 000', 'до 90000', '100-150к'.
+    # (None, None), если чисел нет или граница вне USER_SALARY_MIN..USER_SALARY_MAX
+    matches = list(SALARY_NUMBER.finditer(text or ''))[:2]
+    if not matches:
+        return None, None
+    numbers = []
+    for match in matches:
+        value = float(re.sub(r'\D', '', match['integer']) + '.' + (match['fraction'] or '0'))
+        multiplier = match['multiplier']
+        numbers.append((value, SALARY_MULTIPLIERS[multiplier.lower()] if multiplier else None))
+    # '80-120 тыс.': множитель последнего числа относится и к предыдущему, если у того своего нет
+    last_multiplier = numbers[-1][1] or 1
+    values = [value * (multiplier or (last_multiplier if value < 1000 else 1)) for value, multiplier in numbers]
+    if any(not USER_SALARY_MIN <= value <= USER_SALARY_MAX for value in values):
+        return None, None
+    if len(values) == 1:
+        return (None, values[0]) if text.strip().lower().startswith('до') else (values[0], None)
+    return min(values), max(values)
+
+def salary_to_rub(salary_from, salary_to, currency, rates):
+    # Середина вилки, а если указана одна граница — она сама; в рублях по таблице курсов
+    bounds = [value for value in (salary_from, salary_to) if value is not None]
+    rate = rates.get(currency or 'RUR')
+    if not bounds or rate is None:
+        return None
+    return sum(bounds) / len(bounds) * rate
+
+def percentile(sorted_values, q):
+    # Линейная интерполяция между соседними значениями, как numpy.percentile по умолчанию
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def salary_summary(salaries):
+    if not salaries:
+        return None
+    values = sorted(salaries)
+    return {
+        'min': values[0],
+        'max': values[-1],
+        'mean': sum(salaries) / len(salaries),
+        'p25': percentile(values, 0.25),
+        'median': percentile(values, 0.5),
+        'p75': percentile(values, 0.75),
+    }
+
+def calculate_salary_range(vacancies):
+    salaries = [vacancy['salary_rub'] for vacancy in vacancies if vacancy['salary_rub'] is not None]
+    if salaries:
+        return min(salaries), max(salaries), sum(salaries) / len(salaries)
+    return None, None, None
+
+def analyze_requirements(vacancies):
+    # Навыки извлекаются при разборе вакансии (skills.py), здесь их остаётся только посчитать
+    skill_counts = Counter()
+    for vacancy in vacancies:
+        skill_counts.update(vacancy['skills'])
+    return skill_counts.most_common(5)
+
+def analyze_experience(vacancies):
+    experience_counts = Counter()
+    for vacancy in vacancies:
+        experience = vacancy.get('Опыт работы', 'Не указан')
+        experience_counts[experience] += 1
+    return experience_counts.most_common()
@@ -0,0 +1,388 @@
+import argparse
+import array
+import math
+import os
+import sqlite3
+import sys
+import time
+import zlib
+from collections import defaultdict
+
+import analytics
+import storage
+
+# Архив снимков для истории зарплат и спроса. После каждой публикации региона его вакансии
+# дописываются в archive.sqlite снимком: отсортированные id вакансий, дельта-кодированные и сжатые zlib.
+# Сами поля (зарплата, опыт, профессии) хранятся колонками только для вакансий, которые появились
+# или изменились с прошлых снимков, поэтому ежедневный снимок спокойного региона занимает
+# несколько килобайт. Запросы по времени идут к таблице rollups — агрегатам, посчитанным
+# при записи снимка, без распаковки снимков.
+
+ARCHIVE_PATH = 'archive.sqlite'
+COMPRESSION_LEVEL = 9
+# Шаг точек на графике динамики и сколько истории показывать в боте
+TREND_PERIOD = 24 * 60 * 60
+TREND_HISTORY = 365 * 24 * 60 * 60
+PERIODS = {'day': 24 * 60 * 60, 'week': 7 * 24 * 60 * 60, 'month': 30 * 24 * 60 * 60}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    region_id INTEGER NOT NULL,
+    taken REAL NOT NULL,
+    vacancies INTEGER NOT NULL,
+    ids BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_region ON snapshots (region_id, taken);
+CREATE TABLE IF NOT EXISTS records (
+    snapshot_id INTEGER PRIMARY KEY REFERENCES snapshots (id),
+    count INTEGER NOT NULL,
+    ids BLOB NOT NULL,
+    salaries BLOB NOT NULL,
+    experiences BLOB NOT NULL,
+    professions BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hh_id INTEGER PRIMARY KEY,
+    fingerprint INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS codes (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    PRIMARY KEY (kind, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    region_id INTEGER NOT NULL,
+    profession TEXT NOT NULL,
+    experience TEXT NOT NULL,
+    taken REAL NOT NULL,
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+    vacancies INTEGER NOT NULL,
+    new_vacancies INTEGER NOT NULL,
+    salaries INTEGER NOT NULL,
+    salary_mean REAL,
+    salary_p25 REAL,
+    salary_median REAL,
+    salary_p75 REAL,
+    PRIMARY KEY (region_id, profession, experience, taken)
+) WITHOUT ROWID;
+'''
+
+
+def connect(path=ARCHIVE_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def files_mtime(path=ARCHIVE_PATH):
+    return storage.data_files_mtime(path)
+
+
+# Колонки хранятся в little-endian независимо от платформы
+
+def pack(typecode, values):
+    column = array.array(typecode, values)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return zlib.compress(column.tobytes(), COMPRESSION_LEVEL)
+
+
+def unpack(typecode, blob):
+    column = array.array(typecode)
+    column.frombytes(zlib.decompress(blob))
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def pack_ids(ids):
+    # Отсортированные id почти подряд: разности маленькие и хорошо сжимаются
+    previous = 0
+    deltas = []
+    for hh_id in ids:
+        deltas.append(hh_id - previous)
+        previous = hh_id
+    return pack('q', deltas)
+
+
+def unpack_ids(blob):
+    ids = []
+    current = 0
+    for delta in unpack('q', blob):
+        current += delta
+        ids.append(current)
+    return ids
+
+
+def load_codes(conn, kind):
+    return {row['name']: row['code'] for row in conn.execute('SELECT name, code FROM codes WHERE kind = ?', (kind,))}
+
+
+def get_code(conn, codes, kind, name):
+    if name not in codes:
+        codes[name] = len(codes)
+        conn.execute('INSERT INTO codes (kind, name, code) VALUES (?, ?, ?)', (kind, name, codes[name]))
+    return codes[name]
+
+
+def region_records(db_conn, region_id):
+    # Опубликованные вакансии региона: {hh_id: (зарплата в рублях или None, опыт, профессии)}
+    rows = db_conn.execute('''
+        SELECT v.hh_id, v.salary_rub, v.experience, (
+            SELECT GROUP_CONCAT(profession, ?) FROM vacancy_professions WHERE vacancy_id = v.id
+        ) AS professions
+        FROM vacancies v
+        WHERE v.region_id = ? AND v.source = 'hh'
+    ''', (storage.PROFESSION_SEPARATOR, region_id))
+    records = {}
+    for row in rows:
+        if row['hh_id'] and row['hh_id'].isdigit():
+            records[int(row['hh_id'])] = (
+                row['salary_rub'], row['experience'], tuple(sorted(storage.split_professions(row['professions'])))
+            )
+    return records
+
+
+def fingerprint(record):
+    return zlib.crc32(repr(record).encode('utf-8'))
+
+
+def previous_ids(conn, region_id):
+    row = conn.execute(
+        'SELECT ids FROM snapshots WHERE region_id = ? ORDER BY taken DESC LIMIT 1', (region_id,)
+    ).fetchone()
+    return set(unpack_ids(row['ids'])) if row else set()
+
+
+def write_rollups(conn, snapshot_id, region_id, taken, records, new_ids):
+    groups = defaultdict(list)
+    # Порядок по id: пересчёт из архива даёт те же суммы с плавающей точкой
+    for hh_id, (salary, experience, professions) in sorted(records.items()):
+        for profession in professions:
+            for group_experience in (experience, storage.ANY_EXPERIENCE):
+                groups[(profession, group_experience)].append((hh_id, salary))
+    for (profession, experience), members in groups.items():
+        salaries = [salary for _, salary in members if salary is not None]
+        summary = analytics.salary_summary(salaries) or {}
+        conn.execute(
+            'INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                region_id, profession, experience, taken, snapshot_id, len(members),
+                sum(1 for hh_id, _ in members if hh_id in new_ids), len(salaries),
+                summary.get('mean'), summary.get('p25'), summary.get('median'), summary.get('p75'),
+            )
+        )
+
+
+def add_snapshot(conn, region_id, records, taken=None):
+    # records: {hh_id: (зарплата, опыт, профессии)}; в колонки попадают только новые и изменившиеся
+    taken = taken or time.time()
+    with conn:
+        ids = sorted(records)
+        new_ids = set(ids) - previous_ids(conn, region_id)
+        snapshot_id = conn.execute(
+            'INSERT INTO snapshots (region_id, taken, vacancies, ids) VALUES (?, ?, ?, ?)',
+            (region_id, taken, len(ids), pack_ids(ids))
+        ).lastrowid
+
+        known = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            known.update(conn.execute(
+                f'SELECT hh_id, fingerprint FROM fingerprints WHERE hh_id IN ({",".join("?" * len(chunk))})', chunk
+            ).fetchall())
+        changed = [hh_id for hh_id in ids if known.get(hh_id) != fingerprint(records[hh_id])]
+        if changed:
+            experience_codes = load_codes(conn, 'experience')
+            profession_codes = load_codes(conn, 'profession')
+            masks = []
+            for hh_id in changed:
+                mask = 0
+                for profession in records[hh_id][2]:
+                    mask |= 1 << get_code(conn, profession_codes, 'profession', profession)
+                masks.append(mask)
+            conn.execute(
+                'INSERT INTO records (snapshot_id, count, ids, salaries, experiences, professions) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    snapshot_id, len(changed), pack_ids(changed),
+                    pack('d', (math.nan if records[hh_id][0] is None else records[hh_id][0] for hh_id in changed)),
+                    pack('B', (get_code(conn, experience_codes, 'experience', records[hh_id][1]) for hh_id in changed)),
+                    pack('Q', masks),
+                )
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO fingerprints (hh_id, fingerprint) VALUES (?, ?)',
+                ((hh_id, fingerprint(records[hh_id])) for hh_id in changed)
+            )
+
+        write_rollups(conn, snapshot_id, region_id, taken, records, new_ids)
+    return snapshot_id, len(changed)
+
+
+def snapshot_region(conn, db_conn, region_id, taken=None):
+    return add_snapshot(conn, region_id, region_records(db_conn, region_id), taken)
+
+
+def load_snapshot(conn, snapshot_id):
+    # Полное состояние снимка: для каждой вакансии — последняя версия полей не позже этого снимка
+    snapshot = conn.execute('SELECT ids FROM snapshots WHERE id = ?', (snapshot_id,)).fetchone()
+    wanted = set(unpack_ids(snapshot['ids']))
+    experience_names = {code: name for name, code in load_codes(conn, 'experience').items()}
+    profession_names = {code: name for name, code in load_codes(conn, 'profession').items()}
+    records = {}
+    for row in conn.execute('SELECT * FROM records WHERE snapshot_id <= ? ORDER BY snapshot_id', (snapshot_id,)):
+        columns = zip(
+            unpack_ids(row['ids']), unpack('d', row['salaries']), unpack('B', row['experiences']),
+            unpack('Q', row['professions'])
+        )
+        for hh_id, salary, experience, mask in columns:
+            if hh_id in wanted:
+                records[hh_id] = (
+                    None if math.isnan(salary) else salary,
+                    experience_names[experience],
+                    tuple(sorted(name for code, name in profession_names.items() if mask >> code & 1)),
+                )
+    return records
+
+
+def rebuild_rollups(conn):
+    # Пересчёт агрегатов по всем снимкам, например после изменения набора метрик
+    with conn:
+        conn.execute('DELETE FROM rollups')
+    previous = {}
+    for snapshot in conn.execute('SELECT id, region_id, taken FROM snapshots ORDER BY taken').fetchall():
+        records = load_snapshot(conn, snapshot['id'])
+        with conn:
+            write_rollups(conn, snapshot['id'], snapshot['region_id'], snapshot['taken'], records,
+                          set(records) - previous.get(snapshot['region_id'], set()))
+        previous[snapshot['region_id']] = set(records)
+
+
+def trend(conn, region_id, profession, experience=None, since=None, until=None, period=None):
+    # Агрегаты по снимкам во времени; с period — последний снимок каждого отрезка (состояние на его конец)
+    experience = storage.normalize_experience(experience) if experience else storage.ANY_EXPERIENCE
+    conditions = ['region_id = ?', 'profession = ?', 'experience = ?']
+    params = [region_id, profession, experience]
+    if since is not None:
+        conditions.append('taken >= ?')
+        params.append(since)
+    if until is not None:
+        conditions.append('taken < ?')
+        params.append(until)
+    where = ' AND '.join(conditions)
+    if period:
+        rows = conn.execute(f'''
+            SELECT r.* FROM rollups r JOIN (
+                SELECT MAX(taken) AS taken FROM rollups WHERE {where} GROUP BY CAST(taken / ? AS INTEGER)
+            ) last USING (taken)
+            WHERE {where}
+            ORDER BY r.taken
+        ''', [*params, period, *params])
+    else:
+        rows = conn.execute(f'SELECT * FROM rollups WHERE {where} ORDER BY taken', params)
+    return [dict(row) for row in rows]
+
+
+def change(conn, region_id, profession, since, until=None, experience=None):
+    # Первая и последняя точки отрезка: (было, стало) или None, если снимков нет
+    points = trend(conn, region_id, profession, experience, since, until)
+    if not points:
+        return None
+    return points[0], points[-1]
+
+
+def load_trends(path=ARCHIVE_PATH, history=TREND_HISTORY, period=TREND_PERIOD):
+    # Точки для бота: {(регион, профессия): [(время, вакансий, медианная зарплата), ...]} по всем уровням опыта
+    if not os.path.exists(path):
+        return {}
+    conn = connect(path)
+    try:
+        rows = conn.execute('''
+            SELECT r.region_id, r.profession, r.taken, r.vacancies, r.salary_median FROM rollups r JOIN (
+                SELECT region_id, profession, MAX(taken) AS taken FROM rollups
+                WHERE experience = ? AND taken >= ?
+                GROUP BY region_id, profession, CAST(taken / ? AS INTEGER)
+            ) last USING (region_id, profession, taken)
+            WHERE r.experience = ?
+            ORDER BY r.taken
+        ''', (storage.ANY_EXPERIENCE, time.time() - history, period, storage.ANY_EXPERIENCE))
+        trends = defaultdict(list)
+        for row in rows:
+            trends[(row['region_id'], row['profession'])].append((row['taken'], row['vacancies'], row['salary_median']))
+        return dict(trends)
+    finally:
+        conn.close()
+
+
+def print_stats(conn):
+    snapshots, vacancies = conn.execute('SELECT COUNT(*), COALESCE(SUM(vacancies), 0) FROM snapshots').fetchone()
+    records = conn.execute('SELECT COALESCE(SUM(count), 0) FROM records').fetchone()[0]
+    size = conn.execute('SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()').fetchone()[0]
+    print(f'Снимков: {snapshots}, вакансий в снимках: {vacancies}, сохранено версий вакансий: {records}, '
+          f'размер архива: {size / 1024:.0f} КБ')
+
+
+def parse_age(value):
+    # '90d', '12w' или '24h' — сколько времени назад
+    units = {'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60}
+    if value[-1:] not in units or not value[:-1].isdigit():
+        raise argparse.ArgumentTypeError(f'ожидалось число с единицей h, d или w: {value}')
+    return int(value[:-1]) * units[value[-1]]
+
+
+def main():
+    import hh_parser
+
+    parser = argparse.ArgumentParser(description='Архив снимков вакансий')
+    parser.add_argument('--archive', default=ARCHIVE_PATH, help='путь к базе архива')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='размер архива и число снимков')
+    subparsers.add_parser('snapshot', help='снять текущие данные всех регионов из базы вакансий')
+    subparsers.add_parser('rebuild', help='пересчитать агрегаты по всем снимкам')
+    trend_parser = subparsers.add_parser('trend', help='динамика зарплат и числа вакансий')
+    trend_parser.add_argument('region', help='название региона')
+    trend_parser.add_argument('profession', help='профессия из hh_parser.professions')
+    trend_parser.add_argument('--experience', help='опыт работы, по умолчанию любой')
+    trend_parser.add_argument('--since', type=parse_age, default=90 * 24 * 60 * 60, help='глубина истории: 90d, 12w')
+    trend_parser.add_argument('--period', choices=PERIODS, help='одна точка на день, неделю или месяц')
+    args = parser.parse_args()
+
+    conn = connect(args.archive)
+    try:
+        if args.command == 'stats':
+            print_stats(conn)
+        elif args.command == 'snapshot':
+            db_conn = storage.connect()
+            try:
+                for region_name, region_id in hh_parser.regions.items():
+                    _, changed = snapshot_region(conn, db_conn, region_id)
+                    print(f'Регион {region_name}: снимок сохранён, новых и изменившихся вакансий {changed}')
+            finally:
+                db_conn.close()
+        elif args.command == 'rebuild':
+            rebuild_rollups(conn)
+        elif args.command == 'trend':
+            region = args.region.lower()
+            if region not in hh_parser.regions:
+                parser.error(f'неизвестный регион: {args.region}')
+            # Профессии хранятся в написании из hh_parser.professions (DevSecOps), ищем без учёта регистра
+            profession = {name.lower(): name for name in hh_parser.professions}.get(args.profession.lower())
+            if profession is None:
+                parser.error(f'неизвестная профессия: {args.profession}')
+            points = trend(conn, hh_parser.regions[region], profession, args.experience,
+                           since=time.time() - args.since, period=PERIODS.get(args.period))
+            for point in points:
+                taken = time.strftime('%Y-%m-%d %H:%M', time.localtime(point['taken']))
+                median = '—' if point['salary_median'] is None else f'{point["salary_median"]:.0f} руб.'
+                print(f'{taken}: вакансий {point["vacancies"]} (новых {point["new_vacancies"]}), медиана {median}')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,600 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from telegram import Update
+from telegram.request import BaseRequest
+
+import analytics
+import archive
+import columnar
+import hh_parser
+import hotsec_bot
+import html_text
+import http_cache
+import skills
+import storage
+from hh_stub import EXPERIENCE_NAMES, make_details, start_stub_server
+
+# Замеры производительности на локальной заглушке HH API (hh_stub.py)
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    # Парсер печатает каждую страницу — в замерах этот вывод не нужен
+    with contextlib.redirect_stdout(io.StringIO()):
+        func(*args, **kwargs)
+    return time.perf_counter() - started
+
+
+def same_datasets(first_dir, second_dir, region_ids):
+    datasets = []
+    for directory in (first_dir, second_dir):
+        conn = storage.connect(os.path.join(directory, storage.DB_PATH))
+        datasets.append([storage.get_vacancies(conn, region_id) for region_id in region_ids])
+        conn.close()
+    return datasets[0] == datasets[1]
+
+
+def bench_sweep(args):
+    server = start_stub_server(latency=args.latency)
+    hh_parser.HH_API_URL = server.url
+    regions_to_crawl = dict(list(hh_parser.regions.items())[:args.regions])
+    workdir = os.getcwd()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as sequential_dir, tempfile.TemporaryDirectory() as async_dir:
+        try:
+            if not args.skip_sequential:
+                os.chdir(sequential_dir)
+                server.reset_stats()
+                elapsed = timed(hh_parser.sweep_sequential, regions_to_crawl)
+                results['последовательный'] = (elapsed, server.request_count)
+
+            os.chdir(async_dir)
+            server.reset_stats()
+            elapsed = timed(asyncio.run, hh_parser.sweep(
+                args.concurrency, regions_to_crawl, rate=args.rate, workers=args.workers
+            ))
+            results[f'asyncio, {args.concurrency} соед., {args.workers} проц.'] = (elapsed, server.request_count)
+
+            if args.incremental:
+                # Повторный обход по заполненному кэшу деталей
+                server.reset_stats()
+                elapsed = timed(asyncio.run, hh_parser.sweep(
+                    args.concurrency, regions_to_crawl, incremental=True, rate=args.rate, workers=args.workers
+                ))
+                results['asyncio, инкрементальный'] = (elapsed, server.request_count)
+        finally:
+            os.chdir(workdir)
+            server.shutdown()
+
+        print(f'Регионов: {len(regions_to_crawl)}, задержка заглушки: {args.latency * 1000:.0f} мс')
+        for name, (elapsed, requests_made) in results.items():
+            print(f'{name:>30}: {elapsed:8.2f} с, {requests_made} запросов, {requests_made / elapsed:8.1f} запр/с')
+
+        if not args.skip_sequential:
+            same = same_datasets(sequential_dir, async_dir, regions_to_crawl.values())
+            print('Данные совпадают' if same else 'Данные различаются')
+
+
+def bench_throttle(args):
+    # Тот же обход против заглушки, которая отвечает 429 сверх лимита и случайными 503:
+    # данные должны совпасть с обходом без ограничений
+    regions_to_crawl = dict(list(hh_parser.regions.items())[:args.regions])
+    workdir = os.getcwd()
+    runs = {}
+    with tempfile.TemporaryDirectory() as clean_dir, tempfile.TemporaryDirectory() as throttled_dir:
+        try:
+            for name, directory, rate_limit, error_rate in (
+                ('без ограничений', clean_dir, 0, 0.0),
+                (f'лимит {args.rate_limit:.0f} запр/с, {args.error_rate:.0%} ошибок', throttled_dir,
+                 args.rate_limit, args.error_rate),
+            ):
+                server = start_stub_server(latency=args.latency, rate_limit=rate_limit, error_rate=error_rate)
+                hh_parser.HH_API_URL = server.url
+                os.chdir(directory)
+                try:
+                    elapsed = timed(asyncio.run, hh_parser.sweep(args.concurrency, regions_to_crawl, rate=args.rate))
+                finally:
+                    server.shutdown()
+                runs[name] = (elapsed, server.request_count, server.status_counts)
+        finally:
+            os.chdir(workdir)
+
+        for name, (elapsed, requests_made, status_counts) in runs.items():
+            print(f'{name:>30}: {elapsed:8.2f} с, {requests_made} запросов, '
+                  f'429: {status_counts[429]}, 503: {status_counts[503]}')
+        same = same_datasets(clean_dir, throttled_dir, regions_to_crawl.values())
+        print('Данные не потеряны' if same else 'Данные различаются')
+
+
+def bench_http_cache(args):
+    # Два полных обхода с кэшем ответов: второй уходит условными запросами и получает 304.
+    # Затем обход без сети (--offline) при остановленной заглушке должен дать те же данные.
+    regions_to_crawl = dict(list(hh_parser.regions.items())[:args.regions])
+    workdir = os.getcwd()
+    runs = {}
+    with tempfile.TemporaryDirectory() as online_dir, tempfile.TemporaryDirectory() as offline_dir:
+        cache_path = os.path.join(online_dir, http_cache.HTTP_CACHE_PATH)
+        server = start_stub_server(latency=args.latency)
+        hh_parser.HH_API_URL = server.url
+        try:
+            os.chdir(online_dir)
+            for name in ('первый обход', 'повторный обход'):
+                server.reset_stats()
+                responses = http_cache.ResponseCache(cache_path)
+                try:
+                    elapsed = timed(asyncio.run, hh_parser.sweep(
+                        args.concurrency, regions_to_crawl, rate=args.rate, fresh=True, workers=args.workers,
+                        responses=responses
+                    ))
+                finally:
+                    responses.close()
+                runs[name] = (elapsed, server.request_count, server.not_modified, server.bytes_sent)
+            server.shutdown()
+
+            os.chdir(offline_dir)
+            responses = http_cache.ResponseCache(cache_path, offline=True)
+            try:
+                elapsed = timed(asyncio.run, hh_parser.sweep(
+                    args.concurrency, regions_to_crawl, rate=args.rate, fresh=True, workers=args.workers,
+                    responses=responses
+                ))
+                runs['без сети'] = (elapsed, 0, 0, 0)
+                http_cache.print_stats(responses)
+            finally:
+                responses.close()
+        finally:
+            os.chdir(workdir)
+            server.shutdown()
+
+        for name, (elapsed, requests_made, not_modified, bytes_sent) in runs.items():
+            print(f'{name:>16}: {elapsed:7.2f} с, {requests_made} запросов, 304: {not_modified}, '
+                  f'получено {bytes_sent / 1024 / 1024:.2f} МБ')
+        same = same_datasets(online_dir, offline_dir, regions_to_crawl.values())
+        print('Данные без сети совпадают' if same else 'Данные без сети различаются')
+
+
+def synthetic_vacancies(count, seed=0):
+    # Строки в том виде, в каком их отдаёт storage.load_dataset; тексты берутся из небольшого пула
+    rng = random.Random(seed)
+    region_ids = list(hh_parser.regions.values())
+    profession_names = list(hh_parser.professions)
+    experiences = ['Нет опыта', 'От 1 года до 3 лет', 'От 3 до 6 лет', 'Более 6 лет']
+    skill_names = skills.get_matcher().skills
+    skill_sets = [sorted(rng.sample(skill_names, rng.randrange(0, 8)), key=skill_names.index) for _ in range(500)]
+    vacancies = []
+    for _ in range(count):
+        vacancies.append((
+            rng.choice(region_ids),
+            rng.sample(profession_names, rng.choice((1, 1, 1, 2))),
+            {
+                'skills': rng.choice(skill_sets),
+                'Опыт работы': rng.choice(experiences),
+                'salary_rub': rng.randrange(40, 400) * 1000.0 if rng.random() < 0.6 else None,
+            },
+        ))
+    return vacancies
+
+
+def python_path(vacancies, region_id, profession):
+    rows = [row for row_region, row_professions, row in vacancies if row_region == region_id and profession in row_professions]
+    return (
+        analytics.calculate_salary_range(rows),
+        analytics.analyze_requirements(rows),
+        analytics.analyze_experience(rows),
+    )
+
+
+def numpy_path(columns, region_id, profession):
+    rows = columns.select(region_id, profession)
+    return (
+        columns.calculate_salary_range(rows),
+        columns.analyze_requirements(rows),
+        columns.analyze_experience(rows),
+    )
+
+
+def same_results(first, second):
+    (first_range, *first_rest), (second_range, *second_rest) = first, second
+    ranges_match = all(
+        a == b or (a is not None and b is not None and math.isclose(a, b, rel_tol=1e-9))
+        for a, b in zip(first_range, second_range)
+    )
+    return ranges_match and first_rest == second_rest
+
+
+def bench_analytics(args):
+    if columnar.np is None:
+        print('NumPy не установлен, векторный путь недоступен')
+        return
+    region_id = hh_parser.regions['москва']
+    profession = 'кибербезопасность'
+    print(f'{"строк":>10} {"Python, с":>12} {"NumPy, с":>12} {"ускорение":>10} {"построение, с":>14}  результаты')
+    for size in args.sizes:
+        vacancies = synthetic_vacancies(size)
+        started = time.perf_counter()
+        columns = columnar.build_columns(vacancies)
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            expected = python_path(vacancies, region_id, profession)
+        python_time = (time.perf_counter() - started) / args.repeat
+
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            actual = numpy_path(columns, region_id, profession)
+        numpy_time = (time.perf_counter() - started) / args.repeat
+
+        verdict = 'совпадают' if same_results(expected, actual) else 'РАЗЛИЧАЮТСЯ'
+        print(f'{size:>10} {python_time:>12.4f} {numpy_time:>12.4f} {python_time / numpy_time:>9.1f}x {build_time:>14.2f}  {verdict}')
+
+
+def description_corpus(path, limit):
+    # Описания из кэша деталей парсера; если кэша нет — сгенерированные заглушкой
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        rows = conn.execute('SELECT body FROM details LIMIT ?', (limit,)).fetchall()
+        conn.close()
+        descriptions = [json.loads(body).get('description') or '' for (body,) in rows]
+        if descriptions:
+            return descriptions, f'кэш {path}'
+    return [make_details(100000 + index)['description'] for index in range(limit)], 'заглушка hh_stub'
+
+
+def bench_html(args):
+    corpus, source = description_corpus(args.cache, args.limit)
+    print(f'Описаний: {len(corpus)} ({source}), {sum(map(len, corpus)) / 1024:.0f} КБ')
+
+    def run(func):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            results = [func(description) for description in corpus]
+        return (time.perf_counter() - started) / args.repeat, results
+
+    soup_time, expected = run(lambda description: html_text.soup_text(description).strip())
+    fast_time, actual = run(html_text.html_to_text)
+    section_time, sections = run(html_text.extract_section)
+    different = sum(first != second for first, second in zip(expected, actual))
+    # Текст для поиска навыков: узлы через перевод строки, как get_text('\n')
+    different += sum(
+        html_text.soup_text(description, '\n').strip() != html_text.html_to_text(description, '\n')
+        for description in corpus
+    )
+    print(f'{"BeautifulSoup get_text":>30}: {soup_time:8.4f} с')
+    print(f'{"html_text.html_to_text":>30}: {fast_time:8.4f} с, {soup_time / fast_time:.1f}x, расхождений: {different}')
+    print(f'{"html_text.extract_section":>30}: {section_time:8.4f} с, '
+          f'раздел «Требования» найден в {sum(section is not None for section in sections)} описаниях')
+
+
+def synthetic_records(count, seed=0):
+    # Вакансии в том виде, в каком их пишет парсер (build_vacancy_row), по регионам из hh_parser.regions
+    rng = random.Random(seed)
+    region_ids = list(hh_parser.regions.values())
+    profession_names = list(hh_parser.professions)
+    skill_names = skills.get_matcher().skills
+    for index in range(count):
+        salary_from = rng.randrange(40, 300) * 1000 if rng.random() < 0.6 else None
+        salary_to = salary_from + rng.randrange(0, 100) * 1000 if salary_from and rng.random() < 0.7 else None
+        currency = 'RUR' if salary_from else None
+        vacancy_skills = sorted(rng.sample(skill_names, rng.randrange(0, 8)), key=skill_names.index)
+        yield rng.choice(region_ids), {
+            'hh_id': str(index),
+            'name': f'Вакансия {index}',
+            'url': f'https://hh.ru/vacancy/{index}',
+            'salary': f'{salary_from} - {salary_to} {currency}' if salary_from else 'Не указана',
+            'salary_from': salary_from,
+            'salary_to': salary_to,
+            'currency': currency,
+            'gross': False,
+            'location': '',
+            'requirements': ', '.join(vacancy_skills),
+            'skills': vacancy_skills,
+            'professions': rng.sample(profession_names, rng.choice((1, 1, 1, 2))),
+            'experience': rng.choice(EXPERIENCE_NAMES),
+            'work_type': rng.choice(('Офис', 'Офис', 'Удалённая работа')),
+        }
+
+
+def generate_dataset(path, size, seed=0):
+    by_region = defaultdict(list)
+    for region_id, record in synthetic_records(size, seed):
+        by_region[region_id].append(record)
+    conn = storage.connect(path)
+    try:
+        for region_id, records in by_region.items():
+            storage.replace_region(conn, region_id, records)
+    finally:
+        conn.close()
+
+
+def generate_history(path, archive_path, days, seed=0, churn=0.02):
+    # Ежедневные снимки за days дней: каждый день у доли churn вакансий меняется зарплата,
+    # столько же исчезает и появляется новых
+    rng = random.Random(seed)
+    db_conn = storage.connect(path)
+    conn = archive.connect(archive_path)
+    try:
+        next_id = 10 ** 9
+        for region_id in hh_parser.regions.values():
+            records = archive.region_records(db_conn, region_id)
+            for day in range(days, 0, -1):
+                archive.add_snapshot(conn, region_id, records, taken=time.time() - day * 24 * 60 * 60)
+                for hh_id in rng.sample(sorted(records), int(len(records) * churn)):
+                    salary, experience, vacancy_professions = records[hh_id]
+                    records[hh_id] = (salary and round(salary * rng.uniform(0.95, 1.1)), experience, vacancy_professions)
+                for hh_id in rng.sample(sorted(records), int(len(records) * churn)):
+                    records[next_id] = records.pop(hh_id)
+                    next_id += 1
+            archive.add_snapshot(conn, region_id, records)
+    finally:
+        conn.close()
+        db_conn.close()
+
+
+def bench_archive(args):
+    workdir = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            generate_dataset(storage.DB_PATH, args.size)
+            started = time.perf_counter()
+            generate_history(storage.DB_PATH, archive.ARCHIVE_PATH, args.days)
+            elapsed = time.perf_counter() - started
+            conn = archive.connect()
+            snapshots = conn.execute('SELECT COUNT(*) FROM snapshots').fetchone()[0]
+            print(f'Снимков: {snapshots} за {elapsed:.1f} с ({elapsed / snapshots * 1000:.1f} мс на снимок)')
+            archive.print_stats(conn)
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            print(f'База вакансий (один снимок): {os.path.getsize(storage.DB_PATH) / 1024:.0f} КБ, '
+                  f'архив ({args.days + 1} снимков): {os.path.getsize(archive.ARCHIVE_PATH) / 1024:.0f} КБ')
+
+            region_id = hh_parser.regions['казань']
+            profession = next(iter(hh_parser.professions))
+            started = time.perf_counter()
+            points = archive.trend(conn, region_id, profession)
+            rollup_ms = (time.perf_counter() - started) * 1000
+            # Тот же ответ сканированием снимков, без агрегатов
+            started = time.perf_counter()
+            snapshot_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM snapshots WHERE region_id = ? ORDER BY taken', (region_id,)
+            )]
+            medians = []
+            for snapshot_id in snapshot_ids:
+                salaries = sorted(
+                    salary for salary, _, vacancy_professions in archive.load_snapshot(conn, snapshot_id).values()
+                    if profession in vacancy_professions and salary is not None
+                )
+                medians.append(analytics.percentile(salaries, 0.5) if salaries else None)
+            scan_ms = (time.perf_counter() - started) * 1000
+            conn.close()
+            assert medians == [point['salary_median'] for point in points]
+            print(f'Динамика {profession}, {len(points)} точек: по агрегатам {rollup_ms:.1f} мс, '
+                  f'сканированием снимков {scan_ms:.0f} мс')
+        finally:
+            os.chdir(workdir)
+
+
+def bench_dataset(args):
+    started = time.perf_counter()
+    generate_dataset(args.db, args.size, args.seed)
+    print(f'{args.size} вакансий записано в {args.db} за {time.perf_counter() - started:.1f} с')
+
+
+class FakeTelegramRequest(BaseRequest):
+    # Ответы Telegram Bot API без сети: бот получает правдоподобные Message, вызовы считаются
+    def __init__(self):
+        self.calls = Counter()
+        self.message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        if api_method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'HotSec', 'username': 'hotsec_benchmark_bot'}
+        elif api_method == 'answerCallbackQuery':
+            result = True
+        else:
+            parameters = request_data.parameters if request_data else {}
+            self.message_id += 1
+            result = {
+                'message_id': self.message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(parameters.get('chat_id', 0)), 'type': 'private'},
+                'text': parameters.get('text') or parameters.get('caption') or '',
+            }
+            if api_method == 'sendPhoto':
+                # Как у Telegram: загруженный файл получает file_id, по которому его можно отправить повторно
+                result['photo'] = [{'file_id': f'photo{self.message_id}', 'file_unique_id': f'unique{self.message_id}',
+                                    'width': 1000, 'height': 600}]
+        return 200, json.dumps({'ok': True, 'result': result}).encode('utf-8')
+
+
+def make_update(bot, update_id, user_id, text=None, data=None):
+    # Сообщение пользователя или, если задан data, нажатие кнопки под сообщением бота
+    user = {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private'},
+        'from': user,
+        'text': text or '',
+    }
+    if data is not None:
+        message['from'] = {'id': 1, 'is_bot': True, 'first_name': 'HotSec'}
+        callback_query = {'id': str(update_id), 'from': user, 'chat_instance': str(user_id), 'data': data,
+                          'message': message}
+        return Update.de_json({'update_id': update_id, 'callback_query': callback_query}, bot)
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return Update.de_json({'update_id': update_id, 'message': message}, bot)
+
+
+# Сценарии диалога: (шаг, текст сообщения, данные кнопки); шаг — обработчик, который должен ответить
+REGION_SCENARIO = [
+    ('start', '/start', None), ('choose_mode', None, 'mode:1'), ('choose_vacancy', None, 'vacancy:0'),
+    ('choose_region', None, f'region:{hh_parser.regions["москва"]}'),
+    ('entering_salary', 'от 100000 до 150000 руб.', None), ('entering_experience', None, 'experience:1'),
+]
+SALARY_SCENARIO = [
+    ('start', '/start', None), ('choose_mode', None, 'mode:2'), ('choose_vacancy_for_salary', None, 'vacancy:0'),
+    ('choose_experience', None, 'experience:1'),
+]
+TREND_SCENARIO = [
+    ('start', '/start', None), ('choose_mode', None, 'mode:3'), ('choose_vacancy_for_trend', None, 'vacancy:0'),
+    ('choose_region_for_trend', None, f'region:{hh_parser.regions["казань"]}'),
+]
+
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {q: analytics.percentile(values, q) * 1000 for q in (0.5, 0.95, 0.99)}
+
+
+async def drive_bot(args):
+    request = FakeTelegramRequest()
+    application = hotsec_bot.build_application('123456:benchmark', request=request, max_in_flight=args.max_in_flight)
+    await application.initialize()
+    await hotsec_bot.post_init(application)
+    # Замер в установившемся режиме: графики уже отрисованы заранее, как у работающего бота
+    await application.bot_data['chart_prerender']
+    latencies = defaultdict(list)
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def user(user_id):
+        rng = random.Random(user_id)
+        for _ in range(args.rounds):
+            scenario = rng.choice([REGION_SCENARIO, SALARY_SCENARIO, TREND_SCENARIO])
+            for step, text, data in scenario:
+                update = make_update(application.bot, next(update_ids), user_id, text, data)
+                started = time.perf_counter()
+                # Через процессор обновлений, как при run_polling/run_webhook: с его лимитом и очередью пользователя
+                await application.update_processor.process_update(update, application.process_update(update))
+                latencies[step].append(time.perf_counter() - started)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(user_id) for user_id in range(1, args.users + 1)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await hotsec_bot.post_shutdown(application)
+        await application.shutdown()
+    return latencies, elapsed, request.calls
+
+
+def bench_bot(args):
+    workdir = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            started = time.perf_counter()
+            generate_dataset(storage.DB_PATH, args.size)
+            generate_history(storage.DB_PATH, archive.ARCHIVE_PATH, 30)
+            print(f'Данные: {args.size} вакансий и 30 дней истории, сгенерированы за {time.perf_counter() - started:.1f} с')
+            # Логи бота на каждое обновление в замер не входят
+            hotsec_bot.logger.setLevel('WARNING')
+            latencies, elapsed, calls = asyncio.run(drive_bot(args))
+        finally:
+            os.chdir(workdir)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f'Пользователей: {args.users}, обновлений: {total}, {elapsed:.2f} с, {total / elapsed:.1f} обновлений/с')
+    print(f'Вызовы Bot API: {dict(calls)}')
+    print(f'{"шаг":>28} {"n":>6} {"p50, мс":>9} {"p95, мс":>9} {"p99, мс":>9}')
+    for step, values in [*latencies.items(), ('все шаги', [v for values in latencies.values() for v in values])]:
+        summary = latency_summary(values)
+        print(f'{step:>28} {len(values):>6} {summary[0.5]:>9.1f} {summary[0.95]:>9.1f} {summary[0.99]:>9.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки парсера и бота')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sweep_parser = subparsers.add_parser('sweep', help='полный обход: последовательный путь против asyncio')
+    sweep_parser.add_argument('--latency', type=float, default=0.02, help='задержка заглушки, сек')
+    sweep_parser.add_argument('--regions', type=int, default=len(hh_parser.regions), help='сколько регионов обходить')
+    sweep_parser.add_argument('--concurrency', type=int, default=hh_parser.CONCURRENCY_PER_HOST)
+    sweep_parser.add_argument('--rate', type=float, default=1000.0,
+                              help='темп asyncio-пути, запр/с; у заглушки по умолчанию нет лимита')
+    sweep_parser.add_argument('--workers', type=int, default=hh_parser.PARSE_WORKERS,
+                              help='процессов для разбора описаний, 0 — в основном процессе')
+    sweep_parser.add_argument('--skip-sequential', action='store_true', help='замерить только asyncio-путь')
+    sweep_parser.add_argument('--incremental', action='store_true', help='добавить повторный инкрементальный обход')
+    sweep_parser.set_defaults(func=bench_sweep)
+
+    throttle_parser = subparsers.add_parser('throttle', help='обход при 429 и 5xx от заглушки')
+    throttle_parser.add_argument('--latency', type=float, default=0.01, help='задержка заглушки, сек')
+    throttle_parser.add_argument('--regions', type=int, default=1, help='сколько регионов обходить')
+    throttle_parser.add_argument('--concurrency', type=int, default=hh_parser.CONCURRENCY_PER_HOST)
+    throttle_parser.add_argument('--rate', type=float, default=200.0, help='стартовый темп парсера, запр/с')
+    throttle_parser.add_argument('--rate-limit', type=float, default=50.0, help='лимит заглушки, запр/с')
+    throttle_parser.add_argument('--error-rate', type=float, default=0.05, help='доля ответов 503')
+    throttle_parser.set_defaults(func=bench_throttle)
+
+    http_cache_parser = subparsers.add_parser('http-cache', help='условные запросы, 304 и обход без сети')
+    http_cache_parser.add_argument('--latency', type=float, default=0.01, help='задержка заглушки, сек')
+    http_cache_parser.add_argument('--regions', type=int, default=3, help='сколько регионов обходить')
+    http_cache_parser.add_argument('--concurrency', type=int, default=hh_parser.CONCURRENCY_PER_HOST)
+    http_cache_parser.add_argument('--rate', type=float, default=1000.0, help='темп парсера, запр/с')
+    http_cache_parser.add_argument('--workers', type=int, default=0,
+                                   help='процессов для разбора описаний, 0 — в основном процессе')
+    http_cache_parser.set_defaults(func=bench_http_cache)
+
+    analytics_parser = subparsers.add_parser('analytics', help='аналитика: списки строк против NumPy')
+    analytics_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    analytics_parser.add_argument('--repeat', type=int, default=3, help='повторов каждого замера')
+    analytics_parser.set_defaults(func=bench_analytics)
+
+    html_parser = subparsers.add_parser('html', help='текст описаний: BeautifulSoup против html_text')
+    html_parser.add_argument('--cache', default=hh_parser.DETAILS_CACHE_PATH, help='кэш деталей парсера с описаниями')
+    html_parser.add_argument('--limit', type=int, default=5000, help='сколько описаний взять')
+    html_parser.add_argument('--repeat', type=int, default=3, help='повторов каждого замера')
+    html_parser.set_defaults(func=bench_html)
+
+    dataset_parser = subparsers.add_parser('dataset', help='синтетическая база вакансий заданного размера')
+    dataset_parser.add_argument('--size', type=int, default=100_000, help='число вакансий')
+    dataset_parser.add_argument('--db', default=storage.DB_PATH, help='куда записать базу')
+    dataset_parser.add_argument('--seed', type=int, default=0)
+    dataset_parser.set_defaults(func=bench_dataset)
+
+    archive_parser = subparsers.add_parser('archive', help='архив снимков: размер и скорость запросов динамики')
+    archive_parser.add_argument('--size', type=int, default=20_000, help='вакансий в синтетической базе')
+    archive_parser.add_argument('--days', type=int, default=90, help='дней истории')
+    archive_parser.set_defaults(func=bench_archive)
+
+    bot_parser = subparsers.add_parser('bot', help='нагрузка на обработчики бота: N пользователей, p50/p95/p99')
+    bot_parser.add_argument('--users', type=int, default=50, help='одновременных пользователей')
+    bot_parser.add_argument('--rounds', type=int, default=5, help='диалогов на пользователя')
+    bot_parser.add_argument('--size', type=int, default=20_000, help='вакансий в синтетической базе')
+    bot_parser.add_argument('--max-in-flight', type=int, default=hotsec_bot.MAX_IN_FLIGHT,
+                            help='одновременно обрабатываемых обновлений; 1 — последовательно')
+    bot_parser.set_defaults(func=bench_bot)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import io
+from datetime import datetime
+
+from matplotlib.figure import Figure
+
+# Отрисовка графиков для бота. Функции выполняются в отдельных процессах (см. hotsec_bot.py),
+# поэтому используют объектный API Figure без глобального состояния pyplot и возвращают PNG-байты.
+
+
+def render_salary_chart(region_salaries, profession, experience):
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+    axes.bar(list(region_salaries.keys()), list(region_salaries.values()), color='skyblue')
+    axes.set_xlabel('Регион')
+    axes.set_ylabel('Средняя зарплата (руб)')
+    axes.set_title(
+        f'Средние зарплаты для специальности "{profession.title()}"\n'
+        f'с опытом работы "{experience}" по регионам'
+    )
+    for label in axes.get_xticklabels():
+        label.set_rotation(45)
+        label.set_horizontalalignment('right')
+    figure.tight_layout()
+
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png')
+    return buf.getvalue()
+
+
+def render_trend_chart(points, profession, region):
+    # points: [(время, вакансий, медианная зарплата или None), ...] по возрастанию времени
+    dates = [datetime.fromtimestamp(taken) for taken, _, _ in points]
+    figure = Figure(figsize=(10, 6))
+    salary_axes = figure.subplots()
+    vacancy_axes = salary_axes.twinx()
+    vacancy_axes.bar(dates, [vacancies for _, vacancies, _ in points], color='lightgray', width=0.8)
+    vacancy_axes.set_ylabel('Вакансий')
+    salary_points = [(date, median) for date, (_, _, median) in zip(dates, points) if median is not None]
+    if salary_points:
+        salary_axes.plot(*zip(*salary_points), color='tab:blue', marker='o', markersize=3)
+    salary_axes.set_ylabel('Медианная зарплата (руб)')
+    # Линия зарплаты поверх столбцов с числом вакансий
+    salary_axes.set_zorder(vacancy_axes.get_zorder() + 1)
+    salary_axes.patch.set_visible(False)
+    salary_axes.set_title(f'Динамика для специальности "{profession.title()}" в регионе {region.title()}')
+    figure.autofmt_xdate()
+    figure.tight_layout()
+
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png')
+    return buf.getvalue()
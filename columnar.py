@@ -0,0 +1,109 @@
+import math
+
+import skills
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Колоночное представление вакансий на NumPy: регион, профессия и опыт — категориальные коды,
+# зарплата — массив float, навыки — булева матрица. Векторные версии функций из analytics.py
+# дают те же результаты, что и проход по списку строк. Без NumPy build_columns возвращает None.
+
+
+class VacancyColumns:
+    def __init__(self, vacancies):
+        count = len(vacancies)
+        self.size = count
+
+        self.region_ids = sorted({region_id for region_id, _, _ in vacancies})
+        region_codes = {region_id: code for code, region_id in enumerate(self.region_ids)}
+        self.regions = np.fromiter((region_codes[region_id] for region_id, _, _ in vacancies), dtype=np.int16, count=count)
+
+        self.experience_names = []
+        experience_codes = {}
+        for _, _, row in vacancies:
+            if row['Опыт работы'] not in experience_codes:
+                experience_codes[row['Опыт работы']] = len(self.experience_names)
+                self.experience_names.append(row['Опыт работы'])
+        self.experiences = np.fromiter(
+            (experience_codes[row['Опыт работы']] for _, _, row in vacancies), dtype=np.int16, count=count
+        )
+
+        # Вакансия может относиться к нескольким профессиям, поэтому у каждой профессии своя маска
+        self.professions = {}
+        for index, (_, vacancy_professions, _) in enumerate(vacancies):
+            for profession in vacancy_professions:
+                if profession not in self.professions:
+                    self.professions[profession] = np.zeros(count, dtype=bool)
+                self.professions[profession][index] = True
+
+        self.salary_rub = np.fromiter(
+            (math.nan if row['salary_rub'] is None else row['salary_rub'] for _, _, row in vacancies),
+            dtype=np.float64, count=count
+        )
+
+        # Теги навыков — булева матрица строка x навык; запросы только суммируют столбцы.
+        # Навыки, которых нет в текущем словаре (строки из старого словаря), добавляются в конец.
+        self.skill_names = list(skills.get_matcher().skills)
+        skill_codes = {skill: code for code, skill in enumerate(self.skill_names)}
+        for _, _, row in vacancies:
+            for skill in row['skills']:
+                if skill not in skill_codes:
+                    skill_codes[skill] = len(self.skill_names)
+                    self.skill_names.append(skill)
+        self.skills = np.zeros((count, len(self.skill_names)), dtype=bool)
+        for index, (_, _, row) in enumerate(vacancies):
+            for skill in row['skills']:
+                self.skills[index, skill_codes[skill]] = True
+
+    def select(self, region_id=None, profession=None, experience=None):
+        mask = np.ones(self.size, dtype=bool)
+        if region_id is not None:
+            if region_id not in self.region_ids:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.regions == self.region_ids.index(region_id)
+        if profession is not None:
+            if profession not in self.professions:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.professions[profession]
+        if experience is not None:
+            if experience not in self.experience_names:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.experiences == self.experience_names.index(experience)
+        return np.flatnonzero(mask)
+
+    def calculate_salary_range(self, rows):
+        salaries = self.salary_rub[rows]
+        salaries = salaries[~np.isnan(salaries)]
+        if not salaries.size:
+            return None, None, None
+        # Сумма попарная, а не последовательная, как у sum(): среднее может отличаться в последнем знаке
+        return float(salaries.min()), float(salaries.max()), float(salaries.sum() / salaries.size)
+
+    def analyze_requirements(self, rows):
+        matrix = self.skills[rows]
+        counts = matrix.sum(axis=0)
+        present = np.flatnonzero(counts)
+        if not present.size:
+            return []
+        # Counter.most_common при равенстве сохраняет порядок первого появления навыка:
+        # строки по порядку, внутри строки — порядок тегов (порядок словаря навыков)
+        first_rows = matrix[:, present].argmax(axis=0)
+        order = sorted(zip(-counts[present], first_rows, present))
+        return [(self.skill_names[skill], int(-count)) for count, _, skill in order[:5]]
+
+    def analyze_experience(self, rows):
+        codes = self.experiences[rows]
+        if not codes.size:
+            return []
+        values, first_rows, counts = np.unique(codes, return_index=True, return_counts=True)
+        order = sorted(zip(-counts, first_rows, values))
+        return [(self.experience_names[code], int(-count)) for count, _, code in order]
+
+
+def build_columns(vacancies):
+    if np is None:
+        return None
+    return VacancyColumns(vacancies)
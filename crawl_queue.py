@@ -0,0 +1,173 @@
+import argparse
+import contextlib
+import sqlite3
+import time
+
+# Общая очередь задач для обхода несколькими процессами-шардами (hh_parser.py --shard).
+# Задача — один регион обхода. Шард берёт задачу, продлевает аренду heartbeat'ом и отмечает результат;
+# задачу, чей шард перестал подавать признаки жизни, забирает другой. Все изменения — под
+# BEGIN IMMEDIATE, поэтому две задачи одновременно не выдаются и завершение обхода видит ровно один шард.
+
+QUEUE_PATH = 'crawl_queue.sqlite'
+# Как часто шард продлевает аренду и через сколько секунд без продления задача возвращается в очередь
+HEARTBEAT_INTERVAL = 30
+LEASE_TIMEOUT = 120
+# Сколько раз выдавать задачу, прежде чем считать регион необойдённым в этом обходе
+MAX_ATTEMPTS = 3
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sweeps (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    finished REAL,
+    published REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    sweep_id INTEGER NOT NULL REFERENCES sweeps (id),
+    region_id INTEGER NOT NULL,
+    region_name TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (sweep_id, region_id)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (sweep_id, status);
+'''
+
+
+def connect(path=QUEUE_PATH):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@contextlib.contextmanager
+def immediate(conn):
+    # Блокировка на запись с начала транзакции: чтение и обновление очереди не перемежаются с другими шардами
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+
+def next_sweep(conn, regions, interval):
+    # Незавершённый обход, к которому можно присоединиться, или новый, если с начала последнего
+    # прошло не меньше interval секунд; иначе None
+    with immediate(conn):
+        row = conn.execute('SELECT id, started, published FROM sweeps ORDER BY id DESC LIMIT 1').fetchone()
+        if row and row['published'] is None:
+            return row['id']
+        if row and time.time() - row['started'] < interval:
+            return None
+        sweep_id = conn.execute('INSERT INTO sweeps (started) VALUES (?)', (time.time(),)).lastrowid
+        conn.executemany(
+            'INSERT INTO tasks (sweep_id, region_id, region_name) VALUES (?, ?, ?)',
+            ((sweep_id, region_id, region_name) for region_name, region_id in regions.items())
+        )
+    return sweep_id
+
+
+def finish_if_done(conn, sweep_id):
+    # Вызывается внутри immediate(): обход завершён, когда не осталось ожидающих и выполняемых задач
+    remaining = conn.execute(
+        "SELECT COUNT(*) FROM tasks WHERE sweep_id = ? AND status IN ('pending', 'running')", (sweep_id,)
+    ).fetchone()[0]
+    if not remaining:
+        conn.execute('UPDATE sweeps SET finished = ? WHERE id = ? AND finished IS NULL', (time.time(), sweep_id))
+
+
+def claim_task(conn, sweep_id, worker):
+    # (имя региона, id региона, номер попытки) или None, если свободных задач нет
+    now = time.time()
+    with immediate(conn):
+        # Задачи упавших шардов: без heartbeat дольше аренды
+        conn.execute('''
+            UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL
+            WHERE sweep_id = ? AND status = 'running' AND heartbeat < ?
+        ''', (MAX_ATTEMPTS, sweep_id, now - LEASE_TIMEOUT))
+        # Последняя задача могла только что исчерпать попытки
+        finish_if_done(conn, sweep_id)
+        row = conn.execute(
+            "SELECT region_id, region_name, attempts FROM tasks WHERE sweep_id = ? AND status = 'pending' "
+            'ORDER BY rowid LIMIT 1', (sweep_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE tasks SET status = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1 "
+            'WHERE sweep_id = ? AND region_id = ?', (worker, now, sweep_id, row['region_id'])
+        )
+    return row['region_name'], row['region_id'], row['attempts'] + 1
+
+
+def heartbeat(path, sweep_id, worker):
+    # Своё соединение: вызывается из потока, чтобы ожидание блокировки не останавливало цикл событий
+    conn = connect(path)
+    try:
+        conn.execute(
+            "UPDATE tasks SET heartbeat = ? WHERE sweep_id = ? AND worker = ? AND status = 'running'",
+            (time.time(), sweep_id, worker)
+        )
+    finally:
+        conn.close()
+
+
+def complete_task(conn, sweep_id, region_id, worker, ok):
+    # Неудачная задача возвращается в очередь, пока не исчерпаны попытки.
+    # Отметку шарда, у которого задачу уже забрали, не принимаем.
+    with immediate(conn):
+        conn.execute('''
+            UPDATE tasks SET status = CASE WHEN ? THEN 'done' WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                worker = NULL
+            WHERE sweep_id = ? AND region_id = ? AND worker = ? AND status = 'running'
+        ''', (ok, MAX_ATTEMPTS, sweep_id, region_id, worker))
+        finish_if_done(conn, sweep_id)
+
+
+def sweep_finished(conn, sweep_id):
+    return conn.execute('SELECT finished FROM sweeps WHERE id = ?', (sweep_id,)).fetchone()['finished'] is not None
+
+
+def done_regions(conn, sweep_id):
+    return [row['region_id'] for row in conn.execute(
+        "SELECT region_id FROM tasks WHERE sweep_id = ? AND status = 'done' ORDER BY rowid", (sweep_id,)
+    )]
+
+
+def mark_published(conn, sweep_id):
+    conn.execute('UPDATE sweeps SET published = ? WHERE id = ? AND published IS NULL', (time.time(), sweep_id))
+
+
+def print_status(conn):
+    for sweep in conn.execute('SELECT * FROM sweeps ORDER BY id DESC LIMIT 5'):
+        counts = dict(conn.execute(
+            'SELECT status, COUNT(*) FROM tasks WHERE sweep_id = ? GROUP BY status', (sweep['id'],)
+        ).fetchall())
+        state = 'опубликован' if sweep['published'] else 'завершён' if sweep['finished'] else 'идёт'
+        started = time.strftime('%Y-%m-%d %H:%M', time.localtime(sweep['started']))
+        print(f'Обход {sweep["id"]} от {started}: {state}, задачи: {counts}')
+    for task in conn.execute("SELECT * FROM tasks WHERE status = 'running'"):
+        print(f'  {task["region_name"]}: {task["worker"]}, heartbeat {time.time() - task["heartbeat"]:.0f} с назад')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Очередь задач шардированного обхода')
+    parser.add_argument('--queue', default=QUEUE_PATH, help='путь к базе очереди')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='последние обходы и занятые задачи')
+    args = parser.parse_args()
+
+    conn = connect(args.queue)
+    if args.command == 'status':
+        print_status(conn)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,76 @@
+import argparse
+import asyncio
 import requests
-import csv
+import aiohttp
+import collections
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
 import time
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import parsedate_to_datetime
+import archive
+import crawl_queue
+import html_text
+import http_cache
+import metrics
+import scheduler
+import storage
+import skills
+
+HH_API_URL = 'https://api.hh.ru'
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
+}
+# Максимум одновременных соединений с одним хостом
+CONCURRENCY_PER_HOST = 10
+REQUEST_TIMEOUT = 30
+# Темп запросов к API, запросов в секунду: стартовый (он же потолок) и нижний предел адаптации
+RATE_LIMIT = 20.0
+MIN_RATE_LIMIT = 1.0
+# Повторы при 429, 5xx и сетевых ошибках с экспоненциальной задержкой и случайным разбросом
+MAX_RETRIES = 6
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+THROTTLE_STATUSES = {429}
+# Ошибки, из-за которых регион или вакансия пропускаются; OfflineMiss — ответа нет в кэше при --offline
+FETCH_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, http_cache.OfflineMiss)
+DETAILS_CACHE_PATH = 'vacancy_cache.sqlite'
+# Повторный разбор (--offline) пишет в свою базу, чтобы не подменять данные, которые отдаёт бот
+OFFLINE_DB_PATH = 'vacancies_offline.db'
+# Поиск: максимальная страница API и предел глубины выдачи (per_page * page не больше 2000)
+SEARCH_PER_PAGE = 100
+SEARCH_MAX_RESULTS = 2000
+# Сколько вакансий одновременно ждут деталей в конвейере и через сколько строк фиксировать staging
+PIPELINE_WINDOW = 50
+SINK_BATCH = 100
+# Разбор описаний в отдельных процессах: число процессов (0 — в основном процессе) и размер пачки
+PARSE_WORKERS = os.cpu_count() or 1
+PARSE_BATCH = 32
+# Прерванный обход продолжается, если начат не раньше, чем столько секунд назад
+RESUME_MAX_AGE = 12 * 60 * 60
+# Интервал между обходами и как часто шард проверяет очередь, когда свободных задач нет
+SWEEP_INTERVAL = 24 * 60 * 60
+SHARD_POLL_INTERVAL = 10
+# Как часто планировщик (--schedule) проверяет расписание, в том числе запуски вне очереди
+SCHEDULE_POLL_INTERVAL = 30
+METRICS_EXPORT_INTERVAL = 15
+
+HH_REQUEST_SECONDS = metrics.histogram('hh_request_seconds', 'Время ответа API hh.ru', ['endpoint'])
+HH_REQUESTS = metrics.counter('hh_requests_total', 'Запросы к API hh.ru по статусу ответа', ['endpoint', 'status'])
+HH_LIMITER_WAIT_SECONDS = metrics.histogram('hh_limiter_wait_seconds', 'Ожидание ограничителя темпа перед запросом')
+HH_RATE_LIMIT = metrics.gauge('hh_rate_limit', 'Текущий темп запросов к API hh.ru, запр/с')
+DETAILS_CACHE_LOOKUPS = metrics.counter('details_cache_lookups_total', 'Обращения к кэшу деталей вакансий', ['result'])
+HTTP_CACHE_LOOKUPS = metrics.counter('http_cache_lookups_total', 'Запросы к API hh.ru через кэш ответов',
+                                     ['endpoint', 'result'])
+HTTP_CACHE_BYTES = metrics.gauge('http_cache_bytes', 'Размер кэша ответов API hh.ru на диске')
+PARSE_STAGE_SECONDS = metrics.histogram('parse_stage_seconds', 'Время этапов конвейера обхода', ['stage'])
+PARSE_STAGE_ITEMS = metrics.counter('parse_stage_items_total', 'Элементы, прошедшие этап конвейера', ['stage'])
 
 regions = {
     'москва': 1,
@@ -68,9 +137,14 @@ professions = {
     ]
 }
 
-def get_vacancies(keyword, area=1, per_page=10, page_limit=3):
-    base_url = 'https://api.hh.ru/vacancies'
+def search_page_limit(per_page, page_limit=None):
+    pages = SEARCH_MAX_RESULTS // per_page
+    return pages if page_limit is None else min(pages, page_limit)
+
+def get_vacancies(keyword, area=1, per_page=SEARCH_PER_PAGE, page_limit=None):
+    base_url = f'{HH_API_URL}/vacancies'
     all_vacancies = []
+    page_limit = search_page_limit(per_page, page_limit)
 
     for page in range(page_limit):
         params = {
@@ -79,10 +153,7 @@ def get_vacancies(keyword, area=1, per_page=10, page_limit=3):
             'per_page': per_page, # Количество вакансий на страницу (макс. 100)
             'page': page          # Текущая страница
         }
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
-        }
-        response = requests.get(base_url, headers=headers, params=params)
+        response = requests.get(base_url, headers=HEADERS, params=params)
         response.raise_for_status()
         data = response.json()
 
@@ -92,18 +163,16 @@ def get_vacancies(keyword, area=1, per_page=10, page_limit=3):
         all_vacancies.extend(data['items'])
         print(f'Получено {len(data["items"])} вакансий с {page + 1}-й страницы для региона {area}.')
 
-        if (page + 1) >= page_limit:
+        # Страниц в выдаче меньше, чем мы готовы запросить: дальше только пустые ответы
+        if page + 1 >= data.get('pages', page_limit):
             break
 
     return all_vacancies
 
 def get_vacancy_details(vacancy_id):
-    url = f'https://api.hh.ru/vacancies/{vacancy_id}'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0.4664.110 Safari/537.36'
-    }
+    url = f'{HH_API_URL}/vacancies/{vacancy_id}'
     try:
-        response = requests.get(url, headers=headers)
+        response = requests.get(url, headers=HEADERS)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.HTTPError as e:
@@ -111,8 +180,9 @@ def get_vacancy_details(vacancy_id):
         return None
 
 def extract_requirements(description):
-    soup = BeautifulSoup(description, 'html.parser')
-    return soup.get_text().strip()
+    # Только раздел «Требования», если он выделен в описании, иначе весь текст
+    section = html_text.extract_section(description)
+    return section if section is not None else html_text.html_to_text(description)
 
 def format_salary(salary):
     if salary:
@@ -137,57 +207,720 @@ def get_work_type(vacancy_details):
     
     return 'Офис'
 
-def save_to_csv(vacancies, filename):
-    with open(filename, 'w', encoding='utf-8', newline='') as file:
-        writer = csv.DictWriter(file, fieldnames=[
-            'Название', 'Ссылка', 'Зарплата', 'Локация', 'Требования', 'Профессия', 'Опыт работы', 'Тип работы'
-        ])
-        writer.writeheader()
+def save_region(conn, region_name, region_id, vacancies):
+    storage.replace_region(conn, region_id, vacancies)
+    print(f'Сохранено {len(vacancies)} вакансий региона {region_name} в {storage.database_path(conn)}')
+    archive_regions(conn, [region_id])
+
+def archive_regions(conn, region_ids):
+    # Снимок только что опубликованных регионов в архив истории; сбой архива обход не останавливает
+    try:
+        with PARSE_STAGE_SECONDS.time(stage='archive'):
+            archive_conn = archive.connect()
+            try:
+                for region_id in region_ids:
+                    archive.snapshot_region(archive_conn, conn, region_id)
+            finally:
+                archive_conn.close()
+    except sqlite3.Error as e:
+        print(f'Не удалось сохранить снимок в архив {archive.ARCHIVE_PATH}: {e}')
+
+class DetailsCache:
+    # Кэш деталей вакансий на диске, ключ — id вакансии. HH обновляет published_at
+    # при изменении вакансии, поэтому запись с другим published_at считается устаревшей.
+    def __init__(self, path=DETAILS_CACHE_PATH, use_cached=True):
+        self.conn = sqlite3.connect(path, timeout=30)
+        # Кэш общий для шардов (--shard): WAL и короткие транзакции, чтобы процессы не ждали друг друга
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS details (
+                id TEXT PRIMARY KEY,
+                region_id INTEGER NOT NULL,
+                published_at TEXT,
+                body TEXT NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS details_region ON details (region_id)')
+        self.use_cached = use_cached
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, vacancy):
+        row = None
+        if self.use_cached:
+            row = self.conn.execute(
+                'SELECT body FROM details WHERE id = ? AND published_at IS ?',
+                (vacancy['id'], vacancy.get('published_at'))
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            DETAILS_CACHE_LOOKUPS.inc(result='miss')
+            return None
+        self.hits += 1
+        DETAILS_CACHE_LOOKUPS.inc(result='hit')
+        return json.loads(row[0])
+
+    def put(self, region_id, vacancy, vacancy_details):
+        self.conn.execute(
+            'INSERT OR REPLACE INTO details (id, region_id, published_at, body) VALUES (?, ?, ?, ?)',
+            (vacancy['id'], region_id, vacancy.get('published_at'), json.dumps(vacancy_details, ensure_ascii=False))
+        )
+        self.conn.commit()
 
+    def prune(self, region_id, seen_ids):
+        # Вакансии региона, которые больше не находятся поиском, удаляем из кэша
+        cached_ids = {row[0] for row in self.conn.execute('SELECT id FROM details WHERE region_id = ?', (region_id,))}
+        stale_ids = cached_ids - set(seen_ids)
+        self.conn.executemany('DELETE FROM details WHERE id = ?', ((vacancy_id,) for vacancy_id in stale_ids))
+        self.conn.commit()
+        return len(stale_ids)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def index_vacancies(search_results):
+    # Одна вакансия находится по нескольким синонимам и профессиям:
+    # оставляем её один раз и собираем все профессии, по которым она нашлась
+    index = {}
+    for profession, vacancies in search_results:
         for vacancy in vacancies:
-            writer.writerow({
-                'Название': vacancy['name'],
-                'Ссылка': vacancy['alternate_url'],
-                'Зарплата': format_salary(vacancy['salary']),
-                'Локация': vacancy['area']['name'],
-                'Требования': vacancy['requirements'],
-                'Профессия': vacancy['profession'],
-                'Опыт работы': vacancy['experience'],
-                'Тип работы': vacancy['work_type']
-            })
+            _, vacancy_professions = index.setdefault(vacancy['id'], (vacancy, []))
+            if profession not in vacancy_professions:
+                vacancy_professions.append(profession)
+    return index
 
-def main():
+def build_vacancy_row(vacancy, vacancy_details, vacancy_professions):
+    salary = vacancy['salary'] or {}
+    # Навыки ищутся по всему описанию, включая 'Будет плюсом:' и 'Обязанности:'; хранится только раздел требований.
+    # Текстовые узлы разделены переводом строки, иначе соседние пункты списка сливаются в одно слово
+    text = html_text.html_to_text(vacancy_details['description'], '\n')
+    requirements = extract_requirements(vacancy_details['description'])
+    return {
+        'hh_id': vacancy['id'],
+        'name': vacancy['name'],
+        'url': vacancy['alternate_url'],
+        'salary': format_salary(vacancy['salary']),
+        'salary_from': salary.get('from'),
+        'salary_to': salary.get('to'),
+        'currency': salary.get('currency'),
+        'gross': salary.get('gross'),
+        'location': vacancy['area']['name'],
+        'requirements': requirements,
+        'skills': skills.extract_skills(text),
+        'professions': vacancy_professions,
+        'experience': vacancy_details.get('experience', {}).get('name', 'Не указан'),
+        'work_type': get_work_type(vacancy_details)
+    }
+
+def build_vacancy_rows(pairs):
+    # Выполняется в процессах пула: пачка (вакансия, детали) -> строки без профессий
+    # и время разбора каждой строки (метрики процессов пула собираются в основном процессе)
+    rows = []
+    timings = []
+    for vacancy, vacancy_details in pairs:
+        if vacancy_details:
+            started = time.perf_counter()
+            rows.append(build_vacancy_row(vacancy, vacancy_details, []))
+            timings.append(time.perf_counter() - started)
+    return rows, timings
+
+def parsed_rows(result):
+    rows, timings = result
+    for elapsed in timings:
+        PARSE_STAGE_SECONDS.observe(elapsed, stage='extract')
+    PARSE_STAGE_ITEMS.inc(len(rows), stage='extract')
+    return rows
+
+def create_parse_pool(workers):
+    if workers <= 0:
+        return None
+    # forkserver: процессы не наследуют сессию aiohttp и соединения с базой
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+def print_dedup_stats(region_name, hits, unique):
+    print(f'Регион {region_name}: {hits} совпадений в поиске, {unique} уникальных вакансий')
+
+def sweep_sequential(regions_to_crawl=None, db_path=storage.DB_PATH):
+    # Старый последовательный обход, оставлен для сравнения в benchmark.py
+    conn = storage.connect(db_path)
+    for region_name, region_id in (regions_to_crawl or regions).items():
+        search_results = []
+
+        for profession, synonyms in professions.items():
+            for spec in synonyms:
+                print(f'Поиск вакансий по специальности: {spec} в регионе {region_name}')
+                vacancies = get_vacancies(keyword=spec, area=region_id)
+                search_results.append((profession, vacancies))
+
+        index = index_vacancies(search_results)
+        print_dedup_stats(region_name, sum(len(vacancies) for _, vacancies in search_results), len(index))
+        all_vacancies = []
+        for vacancy, vacancy_professions in index.values():
+            vacancy_details = get_vacancy_details(vacancy['id'])
+            if vacancy_details:
+                all_vacancies.append(build_vacancy_row(vacancy, vacancy_details, vacancy_professions))
+
+        save_region(conn, region_name, region_id, all_vacancies)
+    conn.close()
+
+class RateLimiter:
+    # Token bucket, общий для всех запросов к HH. Темп адаптируется по AIMD:
+    # при ответах 429 уменьшается вдвое, после успешных ответов растёт обратно на ~1 запр/с в секунду.
+    def __init__(self, rate=RATE_LIMIT, min_rate=MIN_RATE_LIMIT):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.capacity = max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.lock = asyncio.Lock()
+        HH_RATE_LIMIT.set(rate)
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def on_success(self):
+        self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+        HH_RATE_LIMIT.set(self.rate)
+
+    def on_throttle(self, retry_after=None):
+        now = time.monotonic()
+        # Волна 429 от уже отправленных запросов снижает темп один раз, а не на каждый ответ
+        if now - self.last_decrease >= 1.0:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.last_decrease = now
+            HH_RATE_LIMIT.set(self.rate)
+            print(f'HH ограничивает запросы, темп снижен до {self.rate:.1f} запр/с')
+        self.tokens = 0.0
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt):
+    # Full jitter: случайная задержка до экспоненциально растущего предела
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+class HHClient:
+    # Все запросы к API идут через одну сессию и общий ограничитель темпа.
+    # С cache (http_cache.ResponseCache) запросы условные, а в режиме offline сеть не используется вовсе.
+    def __init__(self, session, limiter, cache=None):
+        self.session = session
+        self.limiter = limiter
+        self.cache = cache
+
+    async def get_json(self, url, params=None):
+        if self.cache is None:
+            _, body, _ = await self.request(url, params)
+            return json.loads(body)
+        endpoint = 'search' if url.endswith('/vacancies') else 'vacancy'
+        key = http_cache.cache_key(url, params)
+        entry = self.cache.get(key)
+        if self.cache.offline:
+            if entry is None:
+                self.cache.missed += 1
+                HTTP_CACHE_LOOKUPS.inc(endpoint=endpoint, result='offline_miss')
+                raise http_cache.OfflineMiss(key)
+            self.cache.replayed += 1
+            HTTP_CACHE_LOOKUPS.inc(endpoint=endpoint, result='replayed')
+            return json.loads(self.cache.body(entry))
+        status, body, headers = await self.request(url, params, self.cache.validators(entry))
+        if status == 304 and entry is not None:
+            self.cache.revalidate(key, headers)
+            self.cache.not_modified += 1
+            HTTP_CACHE_LOOKUPS.inc(endpoint=endpoint, result='not_modified')
+            return json.loads(self.cache.body(entry))
+        self.cache.store(key, body, headers)
+        self.cache.downloaded += 1
+        HTTP_CACHE_LOOKUPS.inc(endpoint=endpoint, result='downloaded')
+        HTTP_CACHE_BYTES.set(self.cache.size)
+        return json.loads(body)
+
+    async def request(self, url, params=None, headers=None):
+        # (статус, тело, заголовки) успешного ответа или 304 с повторами по RETRY_STATUSES
+        endpoint = 'search' if url.endswith('/vacancies') else 'vacancy'
+        for attempt in range(MAX_RETRIES + 1):
+            with HH_LIMITER_WAIT_SECONDS.time():
+                await self.limiter.acquire()
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                async with self.session.get(url, params=params, headers=headers) as response:
+                    status = response.status
+                    if response.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                        response.raise_for_status()
+                        body = await response.read()
+                        self.limiter.on_success()
+                        return response.status, body, response.headers
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if response.status in THROTTLE_STATUSES:
+                        self.limiter.on_throttle(retry_after)
+                    delay = retry_after if retry_after is not None else backoff_delay(attempt)
+                    reason = f'HTTP {response.status}'
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+                reason = repr(e)
+            finally:
+                HH_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+                HH_REQUESTS.inc(endpoint=endpoint, status=status)
+            print(f'{reason} для {url}, повтор {attempt + 1}/{MAX_RETRIES} через {delay:.1f} с')
+            await asyncio.sleep(delay)
+
+async def fetch_vacancies(client, keyword, area=1, per_page=SEARCH_PER_PAGE, page_limit=None, concurrent_pages=True):
+    # Первая страница сообщает число страниц; остальные запрашиваем параллельно (или по одной)
+    # и не дальше последней
+    base_url = f'{HH_API_URL}/vacancies'
+    page_limit = search_page_limit(per_page, page_limit)
+
+    def fetch_page(page):
+        return client.get_json(base_url, params={
+            'text': keyword,
+            'area': area,
+            'per_page': per_page,
+            'page': page
+        })
+
+    first = await fetch_page(0)
+    last_page = min(first.get('pages', 1), page_limit)
+    if concurrent_pages:
+        pages = [first, *await asyncio.gather(*(fetch_page(page) for page in range(1, last_page)))]
+    else:
+        pages = [first]
+        for page in range(1, last_page):
+            pages.append(await fetch_page(page))
+
+    all_vacancies = []
+    for page, data in enumerate(pages):
+        if 'items' not in data:
+            break
+        all_vacancies.extend(data['items'])
+        print(f'Получено {len(data["items"])} вакансий с {page + 1}-й страницы для региона {area}.')
+    return all_vacancies
+
+async def fetch_vacancy_details(client, vacancy_id):
+    try:
+        return await client.get_json(f'{HH_API_URL}/vacancies/{vacancy_id}')
+    except FETCH_ERRORS as e:
+        print(f'Ошибка при запросе вакансии {vacancy_id}: {e}')
+        return None
+
+@PARSE_STAGE_SECONDS.time(stage='details')
+async def fetch_cached_details(client, cache, region_id, vacancy):
+    vacancy_details = cache.get(vacancy)
+    if vacancy_details is None:
+        vacancy_details = await fetch_vacancy_details(client, vacancy['id'])
+        if vacancy_details:
+            cache.put(region_id, vacancy, vacancy_details)
+    return vacancy_details
+
+def search_plan():
+    return [(profession, spec) for profession, synonyms in professions.items() for spec in synonyms]
+
+# Обход региона — конвейер асинхронных генераторов: поиск -> детали -> разбор -> запись в staging.
+# В памяти только окно вакансий, ожидающих деталей; всё найденное и обработанное сразу уходит в базу.
+
+async def search_stage(client, conn, region_name, region_id):
+    # После перезапуска сначала отдаём найденные, но не обработанные вакансии, выполненные поиски не повторяем
+    for vacancy in storage.pending_hits(conn, region_id):
+        yield vacancy
+    done = storage.staged_searches(conn, region_id)
+
+    async def search_keyword(ordinal, profession, spec):
+        print(f'Поиск вакансий по специальности: {spec} в регионе {region_name}')
+        with PARSE_STAGE_SECONDS.time(stage='search'):
+            vacancies = await fetch_vacancies(client, keyword=spec, area=region_id)
+        return ordinal, profession, vacancies
+
+    tasks = [
+        asyncio.create_task(search_keyword(ordinal, profession, spec))
+        for ordinal, (profession, spec) in enumerate(search_plan())
+        if ordinal not in done
+    ]
+    hits = 0
+    try:
+        for next_search in asyncio.as_completed(tasks):
+            ordinal, profession, vacancies = await next_search
+            hits += len(vacancies)
+            PARSE_STAGE_ITEMS.inc(len(vacancies), stage='search')
+            # Каждая вакансия идёт дальше один раз, сколько бы поисков её ни нашли
+            for vacancy in storage.stage_search(conn, region_id, ordinal, profession, vacancies):
+                yield vacancy
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    print_dedup_stats(region_name, hits, len(storage.staged_hit_ids(conn, region_id)))
+
+async def fetch_details_pair(client, cache, region_id, vacancy):
+    return vacancy, await fetch_cached_details(client, cache, region_id, vacancy)
+
+async def detail_stage(client, cache, region_id, vacancies, window=PIPELINE_WINDOW):
+    # Детали запрашиваются сразу, не дожидаясь остальных поисков; готовые отдаются в порядке завершения
+    pending = set()
+    try:
+        async with contextlib.aclosing(vacancies):
+            async for vacancy in vacancies:
+                pending.add(asyncio.create_task(fetch_details_pair(client, cache, region_id, vacancy)))
+                if len(pending) >= window:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def extract_stage(pairs, pool=None, parse_window=1):
+    # Профессии добавляются при публикации: к этому моменту не все поиски завершены.
+    # С пулом разбор идёт пачками в parse_window процессах; пачки отдаются в порядке отправки,
+    # поэтому порядок строк не зависит от числа процессов.
+    loop = asyncio.get_running_loop()
+    in_flight = collections.deque()
+    batch = []
+    try:
+        async with contextlib.aclosing(pairs):
+            async for pair in pairs:
+                if pool is None:
+                    for record in parsed_rows(build_vacancy_rows([pair])):
+                        yield record
+                    continue
+                batch.append(pair)
+                if len(batch) < PARSE_BATCH:
+                    continue
+                in_flight.append(loop.run_in_executor(pool, build_vacancy_rows, batch))
+                batch = []
+                while len(in_flight) >= parse_window or (in_flight and in_flight[0].done()):
+                    for record in parsed_rows(await in_flight.popleft()):
+                        yield record
+        if batch:
+            in_flight.append(loop.run_in_executor(pool, build_vacancy_rows, batch))
+        while in_flight:
+            for record in parsed_rows(await in_flight.popleft()):
+                yield record
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+async def sink_stage(conn, region_id, records, batch=SINK_BATCH):
+    written = 0
+    try:
+        async with contextlib.aclosing(records):
+            async for record in records:
+                storage.stage_row(conn, region_id, record)
+                written += 1
+                if written % batch == 0:
+                    with PARSE_STAGE_SECONDS.time(stage='sink_commit'):
+                        conn.commit()
+        conn.commit()
+    finally:
+        # Регион упал на середине: незакоммиченный хвост откатываем, иначе открытая транзакция
+        # держит блокировку записи и ломает publish_regions; закоммиченные пачки остаются для продолжения
+        if conn.in_transaction:
+            conn.rollback()
+    PARSE_STAGE_ITEMS.inc(written, stage='sink')
+    return written
+
+async def crawl_region(client, cache, conn, region_name, region_id, window=PIPELINE_WINDOW, pool=None,
+                       parse_window=1, publish=True):
+    hits, misses = cache.hits, cache.misses
+    offline = client.cache is not None and client.cache.offline
+    offline_misses = client.cache.missed if offline else 0
+    vacancies = search_stage(client, conn, region_name, region_id)
+    records = extract_stage(detail_stage(client, cache, region_id, vacancies, window), pool, parse_window)
+    written = await sink_stage(conn, region_id, records)
+    seen_ids = storage.staged_hit_ids(conn, region_id)
+    removed = cache.prune(region_id, seen_ids)
+    # В инкрементальном режиме промахи кэша — новые и изменившиеся вакансии
+    stats = {'vacancies': len(seen_ids), 'fetched': cache.misses - misses, 'removed': removed}
+    print(f'Кэш деталей, регион {region_name}: {cache.hits - hits} попаданий, '
+          f'{stats["fetched"]} запросов к API, удалено {removed} исчезнувших вакансий')
+    if not publish:
+        print(f'Регион {region_name} обработан, в staging {written} новых строк')
+        return stats
+    if offline and client.cache.missed > offline_misses:
+        # Без части деталей регион опубликовался бы урезанным: оставляем прежние данные
+        raise http_cache.OfflineMiss(f'в кэше ответов нет {client.cache.missed - offline_misses} ответов')
+    # Регион публикуется целиком, только когда все поиски и детали обработаны
+    with PARSE_STAGE_SECONDS.time(stage='publish'):
+        count = storage.publish_region(conn, region_id)
+    print(f'Сохранено {count} вакансий региона {region_name} в {storage.database_path(conn)} '
+          f'(обработано в этом запуске: {written})')
+    if not offline:
+        # Повторный разбор старых ответов — не новая точка истории
+        archive_regions(conn, [region_id])
+    return stats
+
+async def sweep(concurrency=CONCURRENCY_PER_HOST, regions_to_crawl=None, incremental=False, rate=RATE_LIMIT,
+                fresh=False, workers=PARSE_WORKERS, responses=None, db_path=storage.DB_PATH):
+    # В инкрементальном режиме детали запрашиваются только для новых и изменившихся вакансий;
+    # в полном кэш только заполняется, чтобы следующий инкрементальный запуск мог им пользоваться.
+    # Без сети рабочий кэш деталей не пополняется и не чистится: вместо него временный в памяти
+    offline = responses is not None and responses.offline
+    cache = DetailsCache(':memory:' if offline else DETAILS_CACHE_PATH, use_cached=incremental)
+    conn = storage.connect(db_path)
+    published = storage.begin_sweep(conn, RESUME_MAX_AGE, fresh)
+    if published:
+        print(f'Продолжаем прерванный обход, готовых регионов: {len(published)}')
+    # Одна сессия с пулом keep-alive соединений на весь обход
+    connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    pool = create_parse_pool(workers)
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+            client = HHClient(session, RateLimiter(rate), responses)
+            for region_name, region_id in (regions_to_crawl or regions).items():
+                if region_id in published:
+                    continue
+                try:
+                    # Две пачки на процесс: пока одна разбирается, следующая уже в очереди
+                    await crawl_region(client, cache, conn, region_name, region_id, pool=pool,
+                                       parse_window=2 * workers)
+                except FETCH_ERRORS as e:
+                    # Неполные данные не публикуем: остаются данные прошлого обхода
+                    print(f'Не удалось обойти регион {region_name}, данные не обновлены: {e}')
+                    continue
+        storage.finish_sweep(conn)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        cache.close()
+        conn.close()
+    print(f'Кэш деталей за обход: {cache.hits} попаданий, {cache.misses} запросов к API')
+    if responses is not None:
+        print(f'Кэш ответов: {responses.not_modified} ответов 304, {responses.downloaded} полных ответов, '
+              f'{responses.replayed} без обращения к API')
+
+async def keep_alive(queue_path, sweep_id, worker):
     while True:
-        for region_name, region_id in regions.items():
-            all_vacancies = []
-
-            for profession, synonyms in professions.items():
-                for spec in synonyms:
-                    print(f'Поиск вакансий по специальности: {spec} в регионе {region_name}')
-                    vacancies = get_vacancies(keyword=spec, area=region_id, page_limit=3, per_page=10)
-
-                    for vacancy in vacancies:
-                        vacancy_details = get_vacancy_details(vacancy['id'])
-                        if vacancy_details:
-                            requirements = extract_requirements(vacancy_details['description'])
-                            work_type = get_work_type(vacancy_details)
-                            all_vacancies.append({
-                                'name': vacancy['name'],
-                                'alternate_url': vacancy['alternate_url'],
-                                'salary': vacancy['salary'],
-                                'area': vacancy['area'],
-                                'requirements': requirements,
-                                'profession': profession,
-                                'experience': vacancy_details.get('experience', {}).get('name', 'Не указан'),
-                                'work_type': work_type
-                            })
-
-            filename = f'{region_id}_vacancies.csv'
-            save_to_csv(all_vacancies, filename)
-            print(f'Сохранено {len(all_vacancies)} вакансий в файл {filename}')
-
-        print("Ожидание перед следующим обновлением...")
-        time.sleep(24 * 60 * 60)  # 24 часов в секундах
+        await asyncio.sleep(crawl_queue.HEARTBEAT_INTERVAL)
+        try:
+            await asyncio.to_thread(crawl_queue.heartbeat, queue_path, sweep_id, worker)
+        except sqlite3.Error as e:
+            print(f'Не удалось продлить аренду задач: {e}')
+
+def publish_sweep(conn, queue, sweep_id):
+    # Публиковать может любой шард, заставший обход завершённым: повторная публикация ничего не меняет
+    with PARSE_STAGE_SECONDS.time(stage='publish'):
+        counts = storage.publish_regions(conn, crawl_queue.done_regions(queue, sweep_id), sweep_id)
+    crawl_queue.mark_published(queue, sweep_id)
+    if counts is not None:
+        print(f'Обход {sweep_id} опубликован: {sum(counts.values())} вакансий, регионов: {len(counts)}')
+        archive_regions(conn, counts)
+
+async def crawl_shard(client, cache, conn, queue, queue_path, sweep_id, worker, pool, workers):
+    heartbeat = asyncio.create_task(keep_alive(queue_path, sweep_id, worker))
+    try:
+        while True:
+            task = crawl_queue.claim_task(queue, sweep_id, worker)
+            if task is None:
+                if crawl_queue.sweep_finished(queue, sweep_id):
+                    publish_sweep(conn, queue, sweep_id)
+                    return
+                # Остальные задачи заняты другими шардами: ждём их завершения или истечения аренды
+                await asyncio.sleep(SHARD_POLL_INTERVAL)
+                continue
+            region_name, region_id, attempt = task
+            if attempt == 1:
+                # Staging мог остаться от прошлого обхода; при повторной попытке продолжаем с него
+                with conn:
+                    storage.clear_staging(conn, region_id)
+            print(f'Шард {worker}: регион {region_name}, попытка {attempt}')
+            try:
+                await crawl_region(client, cache, conn, region_name, region_id, pool=pool,
+                                   parse_window=2 * workers, publish=False)
+            except FETCH_ERRORS as e:
+                print(f'Не удалось обойти регион {region_name}: {e}')
+                crawl_queue.complete_task(queue, sweep_id, region_id, worker, ok=False)
+            else:
+                crawl_queue.complete_task(queue, sweep_id, region_id, worker, ok=True)
+    finally:
+        heartbeat.cancel()
+
+async def shard_worker(worker, queue_path=crawl_queue.QUEUE_PATH, concurrency=CONCURRENCY_PER_HOST,
+                       regions_to_crawl=None, incremental=False, rate=RATE_LIMIT, workers=PARSE_WORKERS,
+                       interval=SWEEP_INTERVAL, once=False, responses=None, db_path=storage.DB_PATH):
+    # Один из нескольких процессов обхода с общей очередью задач и общей базой вакансий.
+    # Регионы пишутся в staging и публикуются все разом, когда очередь обхода пуста.
+    queue = crawl_queue.connect(queue_path)
+    cache = DetailsCache(use_cached=incremental)
+    conn = storage.connect(db_path)
+    connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    pool = create_parse_pool(workers)
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+            client = HHClient(session, RateLimiter(rate), responses)
+            while True:
+                sweep_id = crawl_queue.next_sweep(queue, regions_to_crawl or regions, interval)
+                if sweep_id is not None:
+                    await crawl_shard(client, cache, conn, queue, queue_path, sweep_id, worker, pool, workers)
+                    if once:
+                        return
+                await asyncio.sleep(SHARD_POLL_INTERVAL)
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        cache.close()
+        conn.close()
+        queue.close()
+
+async def scheduled_crawl(schedule_path=scheduler.SCHEDULE_PATH, concurrency=CONCURRENCY_PER_HOST,
+                          regions_to_crawl=None, rate=RATE_LIMIT, workers=PARSE_WORKERS, poll=SCHEDULE_POLL_INTERVAL,
+                          responses=None, db_path=storage.DB_PATH):
+    # Регионы обходятся по одному, каждый по своему расписанию. Детали берутся из кэша, поэтому частый
+    # обход спокойного региона стоит несколько поисковых запросов.
+    schedule = scheduler.connect(schedule_path)
+    scheduler.sync_regions(schedule, regions_to_crawl or regions)
+    cache = DetailsCache(use_cached=True)
+    conn = storage.connect(db_path)
+    connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    pool = create_parse_pool(workers)
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+            client = HHClient(session, RateLimiter(rate), responses)
+            while True:
+                due = scheduler.next_due(schedule)
+                wait = due['next_run'] - time.time()
+                if wait > 0:
+                    # Спим короткими отрезками, чтобы заметить 'scheduler.py trigger'
+                    await asyncio.sleep(min(wait, poll))
+                    continue
+                region_name, region_id = due['region_name'], due['region_id']
+                # Staging прерванного обхода региона продолжаем, устаревший начинаем заново
+                if due['started'] is None or time.time() - due['started'] > RESUME_MAX_AGE:
+                    with conn:
+                        storage.clear_staging(conn, region_id)
+                scheduler.mark_started(schedule, region_id)
+                try:
+                    stats = await crawl_region(client, cache, conn, region_name, region_id, pool=pool,
+                                               parse_window=2 * workers)
+                except FETCH_ERRORS as e:
+                    print(f'Не удалось обойти регион {region_name}, повтор через час: {e}')
+                    scheduler.record_failure(schedule, region_id)
+                    continue
+                interval = scheduler.record_run(
+                    schedule, region_id, stats['vacancies'], stats['fetched'] + stats['removed']
+                )
+                print(f'Следующий обход региона {region_name} через {interval / 3600:.1f} ч')
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        cache.close()
+        conn.close()
+        schedule.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Сбор вакансий с hh.ru')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY_PER_HOST,
+                        help='максимум одновременных запросов к api.hh.ru')
+    parser.add_argument('--rate', type=float, default=RATE_LIMIT,
+                        help='максимальный темп запросов к api.hh.ru, запросов в секунду')
+    parser.add_argument('--sequential', action='store_true',
+                        help='старый последовательный режим без asyncio')
+    parser.add_argument('--incremental', action='store_true',
+                        help='запрашивать детали только новых и изменившихся вакансий')
+    parser.add_argument('--workers', type=int, default=PARSE_WORKERS,
+                        help='процессов для разбора описаний, 0 — разбирать в основном процессе')
+    parser.add_argument('--fresh', action='store_true',
+                        help='не продолжать прерванный обход, начать заново')
+    parser.add_argument('--shard', action='store_true',
+                        help='брать регионы из общей очереди вместе с другими процессами обхода')
+    parser.add_argument('--queue', default=crawl_queue.QUEUE_PATH, help='путь к базе очереди для --shard')
+    parser.add_argument('--schedule', action='store_true',
+                        help='обходить регионы по расписанию с интервалом по скорости изменений')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='порт HTTP-эндпоинта /metrics, 0 — не поднимать')
+    parser.add_argument('--metrics-host', default=metrics.METRICS_HOST,
+                        help='адрес HTTP-эндпоинта /metrics; 0.0.0.0 — доступен извне')
+    parser.add_argument('--metrics-file',
+                        help='файл для textfile-коллектора node_exporter, обновляется раз в METRICS_EXPORT_INTERVAL')
+    parser.add_argument('--http-cache', default=http_cache.HTTP_CACHE_PATH,
+                        help='путь к кэшу ответов API для условных запросов (ETag / Last-Modified)')
+    parser.add_argument('--http-cache-mb', type=int, default=http_cache.HTTP_CACHE_MAX_BYTES // 1024 // 1024,
+                        help='предельный размер кэша ответов, МБ')
+    parser.add_argument('--no-http-cache', action='store_true', help='не сохранять ответы API')
+    parser.add_argument('--offline', action='store_true',
+                        help='не обращаться к API: один обход по ответам из кэша ответов (повторный разбор)')
+    parser.add_argument('--db',
+                        help=f'база вакансий, по умолчанию {storage.DB_PATH}, для --offline — {OFFLINE_DB_PATH}')
+    parser.add_argument('--worker-id', default=f'{socket.gethostname()}:{os.getpid()}',
+                        help='имя шарда в очереди')
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port, args.metrics_host)
+    if args.metrics_file:
+        metrics.start_textfile_exporter(args.metrics_file, METRICS_EXPORT_INTERVAL)
+    if args.offline and args.no_http_cache:
+        parser.error('--offline требует кэша ответов')
+    db_path = args.db or (OFFLINE_DB_PATH if args.offline else storage.DB_PATH)
+    if args.offline and os.path.abspath(db_path) == os.path.abspath(storage.DB_PATH):
+        parser.error(f'--offline не пишет в рабочую базу {storage.DB_PATH}, укажите другую в --db')
+
+    responses = None
+    if not args.no_http_cache:
+        responses = http_cache.ResponseCache(args.http_cache, args.http_cache_mb * 1024 * 1024, offline=args.offline)
+    try:
+        if args.offline:
+            # Все детали берутся из сохранённых ответов и разбираются заново. Снимки в архив не пишутся,
+            # а регион, для которого в кэше нашлись не все ответы, не публикуется
+            asyncio.run(sweep(concurrency=args.concurrency, rate=args.rate, fresh=True, workers=args.workers,
+                              responses=responses, db_path=db_path))
+            return
+        if args.schedule:
+            asyncio.run(scheduled_crawl(concurrency=args.concurrency, rate=args.rate, workers=args.workers,
+                                        responses=responses, db_path=db_path))
+            return
+        if args.shard:
+            asyncio.run(shard_worker(args.worker_id, args.queue, concurrency=args.concurrency,
+                                     incremental=args.incremental, rate=args.rate, workers=args.workers,
+                                     responses=responses, db_path=db_path))
+            return
+
+        while True:
+            if args.sequential:
+                sweep_sequential(db_path=db_path)
+            else:
+                asyncio.run(sweep(concurrency=args.concurrency, incremental=args.incremental, rate=args.rate,
+                                  fresh=args.fresh, workers=args.workers, responses=responses, db_path=db_path))
+                args.fresh = False
+
+            print("Ожидание перед следующим обновлением...")
+            time.sleep(24 * 60 * 60)  # 24 часов в секундах
+    finally:
+        if responses is not None:
+            responses.close()
 
 if __name__ == '__main__':
     main()
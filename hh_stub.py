@@ -0,0 +1,218 @@
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Локальная заглушка api.hh.ru: детерминированные синтетические ответы
+# для /vacancies и /vacancies/<id> с настраиваемой задержкой, ограничением темпа (429)
+# и долей случайных ошибок 503. Ответы несут ETag; запрос с совпавшим If-None-Match получает 304 без тела.
+
+EXPERIENCE_NAMES = ['Нет опыта', 'От 1 года до 3 лет', 'От 3 до 6 лет', 'Более 6 лет']
+CURRENCIES = ['RUR', 'RUR', 'RUR', 'USD', 'EUR']
+# Размер пула вакансий на регион: синонимы пересекаются, как в настоящем API
+VACANCIES_PER_AREA = 400
+
+
+def _seed(*parts):
+    return zlib.crc32('|'.join(str(part) for part in parts).encode('utf-8'))
+
+
+def make_salary(rng):
+    if rng.random() < 0.3:
+        return None
+    currency = rng.choice(CURRENCIES)
+    # Вилки в валюте — в тех же рублёвых порядках, пересчитанных по грубому курсу
+    scale = 1 if currency == 'RUR' else 90
+    low = rng.randrange(40, 300) * 1000 // scale
+    return {
+        'from': low if rng.random() < 0.85 else None,
+        'to': low + rng.randrange(10, 150) * 1000 // scale if rng.random() < 0.7 else None,
+        'currency': currency,
+        'gross': rng.random() < 0.5,
+    }
+
+
+def make_vacancy(vacancy_id):
+    rng = random.Random(vacancy_id)
+    area = vacancy_id // 100000
+    return {
+        'id': str(vacancy_id),
+        'name': f'Специалист по безопасности #{vacancy_id}',
+        'alternate_url': f'https://hh.ru/vacancy/{vacancy_id}',
+        'salary': make_salary(rng),
+        'area': {'id': str(area), 'name': f'Регион {area}'},
+        'published_at': f'2024-01-{rng.randrange(1, 29):02d}T10:00:00+0300',
+    }
+
+
+def make_details(vacancy_id):
+    rng = random.Random(vacancy_id)
+    vacancy = make_vacancy(vacancy_id)
+    skills = rng.sample(['Python', 'Linux', 'Docker', 'Kubernetes', 'SQL', 'Git', 'CI/CD', 'AWS', 'Go'], 4)
+    remote = rng.random() < 0.2
+    vacancy.update({
+        'description': (
+            '<p><strong>Обязанности:</strong></p>'
+            '<ul><li>Мониторинг событий безопасности</li><li>Расследование инцидентов</li></ul>'
+            '<p><strong>Требования:</strong></p>'
+            '<ul>' + ''.join(f'<li>Опыт работы с {skill}</li>' for skill in skills) + '</ul>'
+            '<p><strong>Условия:</strong></p>'
+            f'<ul><li>{"Удалённая работа" if remote else "Офис в центре"} &amp; ДМС</li></ul>'
+        ),
+        'experience': {'name': rng.choice(EXPERIENCE_NAMES)},
+        'employment': {'id': 'remote' if remote and rng.random() < 0.5 else 'full'},
+    })
+    return vacancy
+
+
+def search_ids(text, area):
+    rng = random.Random(_seed(text.lower(), area))
+    found = rng.randrange(0, 60)
+    pool = range(area * 100000, area * 100000 + VACANCIES_PER_AREA)
+    return sorted(rng.sample(pool, found))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        etag = f'"{zlib.crc32(body):08x}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            with self.server.lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, retry_after=None):
+        body = json.dumps({'errors': [{'type': 'too_many_requests' if status == 429 else 'unavailable'}]}).encode('utf-8')
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.request_count += 1
+            throttled = server.rate_limit and not server.take_token()
+            failed = not throttled and server.error_rate and random.random() < server.error_rate
+            status = 429 if throttled else 503 if failed else 200
+            server.status_counts[status] += 1
+        if server.latency:
+            time.sleep(server.latency)
+        if throttled:
+            self.send_error_json(429, retry_after=1)
+            return
+        if failed:
+            self.send_error_json(503)
+            return
+
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['vacancies']:
+            query = parse_qs(url.query)
+            text = query.get('text', [''])[0]
+            area = int(query.get('area', ['1'])[0])
+            per_page = min(int(query.get('per_page', ['20'])[0]), 100)
+            page = int(query.get('page', ['0'])[0])
+            ids = search_ids(text, area)
+            pages = (len(ids) + per_page - 1) // per_page
+            chunk = ids[page * per_page:(page + 1) * per_page]
+            self.send_json(200, {
+                'items': [make_vacancy(vacancy_id) for vacancy_id in chunk],
+                'found': len(ids),
+                'pages': pages,
+                'page': page,
+                'per_page': per_page,
+            })
+        elif len(parts) == 2 and parts[0] == 'vacancies' and parts[1].isdigit():
+            self.send_json(200, make_details(int(parts[1])))
+        else:
+            self.send_json(404, {'errors': [{'type': 'not_found'}]})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл keep-alive соединение — для заглушки это не ошибка
+        pass
+
+    def take_token(self):
+        # Серверный token bucket: запросы сверх rate_limit в секунду получают 429
+        now = time.monotonic()
+        self.tokens = min(self.rate_limit, self.tokens + (now - self.tokens_updated) * self.rate_limit)
+        self.tokens_updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def reset_stats(self):
+        with self.lock:
+            self.request_count = 0
+            self.status_counts = Counter()
+            # Ответы 304 (входят в status_counts[200]) и объём отданных тел
+            self.not_modified = 0
+            self.bytes_sent = 0
+
+
+def start_stub_server(host='127.0.0.1', port=0, latency=0.0, rate_limit=0, error_rate=0.0):
+    server = StubServer((host, port), StubHandler)
+    server.latency = latency
+    server.rate_limit = rate_limit
+    server.error_rate = error_rate
+    server.tokens = rate_limit
+    server.tokens_updated = time.monotonic()
+    server.lock = threading.Lock()
+    server.reset_stats()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://{server.server_address[0]}:{server.server_address[1]}'
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальная заглушка API hh.ru')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.05, help='задержка ответа, сек')
+    parser.add_argument('--rate-limit', type=float, default=0, help='запросов в секунду до ответов 429, 0 — без ограничения')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля случайных ответов 503')
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, args.latency, args.rate_limit, args.error_rate)
+    print(f'Заглушка HH API запущена на {server.url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
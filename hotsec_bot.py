@@ -1,10 +1,24 @@
+import argparse
+import asyncio
+import copy
 import logging
-import csv
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, ConversationHandler
-from collections import Counter
-import matplotlib.pyplot as plt
-import io
+import time
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.ext import (
+    Application, BaseUpdateProcessor, CallbackContext, CallbackQueryHandler, CommandHandler, ConversationHandler,
+    MessageHandler, PersistenceInput, PicklePersistence, filters
+)
+from telegram.warnings import PTBUserWarning
+from collections import Counter, OrderedDict, defaultdict
+import archive
+import storage
+import columnar
+import charts
+import metrics
+from analytics import analyze_requirements, parse_salary_text
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
                     level=logging.INFO)
@@ -12,8 +26,8 @@ logger = logging.getLogger(__name__)
 
 (
     CHOOSING_MODE, CHOOSING_VACANCY, CHOOSING_REGION, CHOOSING_VACANCY_FOR_SALARY,
-    CHOOSING_EXPERIENCE, ENTERING_SALARY, ENTERING_EXPERIENCE
-) = range(7)
+    CHOOSING_EXPERIENCE, ENTERING_SALARY, ENTERING_EXPERIENCE, CHOOSING_VACANCY_FOR_TREND, CHOOSING_REGION_FOR_TREND
+) = range(9)
 
 regions = {
     'москва': 1,
@@ -47,72 +61,328 @@ EXPERIENCE_OPTIONS = [
     'более 6 лет'
 ]
 
-def read_vacancies_from_csv(region_id):
-    filename = f'{region_id}_vacancies.csv'
+REGION_NAMES = {region_id: region_name for region_name, region_id in regions.items()}
+
+def keyboard(buttons, columns=1):
+    # buttons — пары (подпись, callback_data)
+    rows = [buttons[index:index + columns] for index in range(0, len(buttons), columns)]
+    return InlineKeyboardMarkup([[InlineKeyboardButton(text, callback_data=data) for text, data in row] for row in rows])
+
+def button_title(text):
+    return text[:1].upper() + text[1:]
+
+MODE_KEYBOARD = keyboard([
+    ('Анализ вакансий по региону', 'mode:1'), ('Анализ зарплат по регионам', 'mode:2'),
+    ('Динамика зарплат и спроса', 'mode:3'),
+])
+VACANCY_KEYBOARD = keyboard([(button_title(vacancy), f'vacancy:{index}') for index, vacancy in enumerate(VACANCIES)])
+REGION_KEYBOARD = keyboard([(name.title(), f'region:{region_id}') for name, region_id in regions.items()], columns=3)
+EXPERIENCE_KEYBOARD = keyboard(
+    [(button_title(experience), f'experience:{index}') for index, experience in enumerate(EXPERIENCE_OPTIONS)], columns=2
+)
+
+# Как часто проверять, не обновил ли парсер базу, секунд
+DATASET_REFRESH_INTERVAL = 30
+# Процессы для отрисовки графиков и сколько готовых графиков держать в памяти
+CHART_WORKERS = 2
+CHART_CACHE_SIZE = 64
+# Порт HTTP-эндпоинта /metrics в формате Prometheus, 0 — не поднимать
+METRICS_PORT = 0
+BOT_TOKEN = "*********************************************"
+# Сколько обработчиков выполняется одновременно и сколько обновлений может ждать своей очереди
+MAX_IN_FLIGHT = 16
+MAX_PENDING_UPDATES = 256
+# Режим webhook: локальный адрес HTTP-сервера, который принимает обновления от Telegram
+WEBHOOK_LISTEN = '127.0.0.1'
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = 'telegram'
+# Состояние диалогов и user_data переживают перезапуск; None — хранить только в памяти
+STATE_PATH = 'bot_state.pickle'
+STATE_FLUSH_INTERVAL = 30
+# Зарплаты пользователей пишутся в базу пачками: не больше SUBMISSION_BATCH за раз,
+# первая запись пачки ждёт попутчиков не дольше SUBMISSION_FLUSH_DELAY секунд
+SUBMISSION_BATCH = 100
+SUBMISSION_FLUSH_DELAY = 2.0
+
+HANDLER_SECONDS = metrics.histogram('bot_handler_seconds', 'Время обработчика состояния диалога', ['handler'])
+CHART_RENDER_SECONDS = metrics.histogram('bot_chart_render_seconds', 'Время отрисовки графика в пуле процессов')
+CHART_CACHE_LOOKUPS = metrics.counter('bot_chart_cache_lookups_total', 'Обращения к кэшу графиков', ['result'])
+DATASET_BUILD_SECONDS = metrics.histogram('bot_dataset_build_seconds', 'Время загрузки данных о вакансиях в память')
+DATASET_VERSION = metrics.gauge('bot_dataset_version', 'Версия загруженных данных о вакансиях')
+SUBMISSIONS_WRITTEN = metrics.counter('bot_submissions_written_total', 'Зарплаты пользователей, записанные в базу')
+SUBMISSION_FLUSH_SECONDS = metrics.histogram('bot_submission_flush_seconds', 'Время записи пачки зарплат пользователей')
+UPDATES_IN_FLIGHT = metrics.gauge('bot_updates_in_flight', 'Обновления, обрабатываемые в данный момент')
+UPDATE_WAIT_SECONDS = metrics.histogram(
+    'bot_update_wait_seconds', 'Ожидание обновления в очереди своего пользователя и общего лимита'
+)
+
+class VacancyDataset:
+    # Разобранные вакансии в памяти процесса с индексами по региону и профессии.
+    # Объект не меняется после построения: при обновлении данных он целиком заменяется новым.
+    def __init__(self, version, mtime, vacancies, stats):
+        self.version = version
+        self.mtime = mtime
+        self.by_region = defaultdict(list)
+        self.by_profession = defaultdict(list)
+        self.by_experience = defaultdict(list)
+        for region_id, vacancy_professions, row in vacancies:
+            self.by_region[region_id].append(row)
+            for profession in vacancy_professions:
+                self.by_profession[(region_id, profession)].append(row)
+                self.by_experience[(region_id, profession, row['Опыт работы'])].append(row)
+
+        # Предрасчитанные парсером агрегаты: ключ (регион, профессия, опыт), '*' — любой опыт
+        self.stats = {}
+        self.experience_counts = defaultdict(list)
+        for row in stats:
+            self.stats[(row['region_id'], row['profession'], row['experience'])] = row
+            if row['experience'] != storage.ANY_EXPERIENCE and row['vacancies']:
+                self.experience_counts[(row['region_id'], row['profession'])].append((row['experience'], row['vacancies']))
+        for counts in self.experience_counts.values():
+            counts.sort(key=lambda item: (-item[1], item[0]))
+
+        # Колоночная копия для векторных подсчётов; None, если NumPy не установлен
+        self.columns = columnar.build_columns(vacancies)
+
+    def get(self, region_id, profession=None, experience=None):
+        if profession is None:
+            return self.by_region.get(region_id, [])
+        if experience is None:
+            return self.by_profession.get((region_id, profession), [])
+        return self.by_experience.get((region_id, profession, storage.normalize_experience(experience)), [])
+
+    def analyze_requirements(self, region_id, profession):
+        if self.columns is not None:
+            return self.columns.analyze_requirements(self.columns.select(region_id, profession))
+        return analyze_requirements(self.get(region_id, profession=profession))
+
+    def get_stats(self, region_id, profession, experience=None):
+        if experience is not None:
+            experience = storage.normalize_experience(experience)
+        return self.stats.get((region_id, profession, experience or storage.ANY_EXPERIENCE))
+
+def build_dataset():
+    archive_mtime = archive.files_mtime()
+    mtime = storage.data_files_mtime()
+    version, vacancies, stats, submissions = storage.load_dataset()
+    dataset = VacancyDataset(version, mtime, vacancies, stats)
+    # (версия зарплат пользователей, id последней записи), см. update_submission_stats
+    dataset.submissions = submissions
+    # Ответы готовятся заранее для всех комбинаций: обработчику остаётся поиск в словаре и одна отправка
+    dataset.region_replies = {
+        (profession, region_id): render_region_reply(dataset, profession, region_id)
+        for profession in VACANCIES for region_id in REGION_NAMES
+    }
+    dataset.salary_charts = {
+        (profession, experience): salary_chart_data(dataset, profession, experience)
+        for profession in VACANCIES for experience in EXPERIENCE_OPTIONS
+    }
+    # История из агрегатов архива снимков: (регион, профессия) -> точки графика динамики
+    dataset.archive_mtime = archive_mtime
+    dataset.trends = archive.load_trends()
+    return dataset
+
+def update_submission_stats(dataset):
+    # Новые зарплаты пользователей меняют только агрегаты своих регионов: копия набора получает эти строки
+    # и заново подготовленные ответы режима 1. Вакансии, версия данных и графики остаются до следующего обхода.
+    mtime = storage.data_files_mtime()
+    version, last_id, region_ids, stats = storage.load_submission_stats(after_id=dataset.submissions[1])
+    updated = copy.copy(dataset)
+    updated.mtime = mtime
+    updated.submissions = (version, last_id)
+    updated.stats = {key: row for key, row in dataset.stats.items() if key[0] not in region_ids}
+    for row in stats:
+        updated.stats[(row['region_id'], row['profession'], row['experience'])] = row
+    updated.region_replies = dict(dataset.region_replies)
+    for profession, region_id in dataset.region_replies:
+        if region_id in region_ids:
+            updated.region_replies[(profession, region_id)] = render_region_reply(updated, profession, region_id)
+    return updated
+
+def dataset_changes(dataset):
+    # Что изменилось после загрузки: 'dataset' — вакансии или архив, 'submissions' — только зарплаты
+    # пользователей, None — ничего. Дешёвая проверка по mtime файлов, версии читаем, только если файлы менялись
+    if archive.files_mtime() != dataset.archive_mtime:
+        return 'dataset'
+    mtime = storage.data_files_mtime()
+    if mtime == dataset.mtime:
+        return None
+    conn = storage.connect()
     try:
-        with open(filename, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            return list(reader)
-    except FileNotFoundError:
+        if storage.get_dataset_version(conn) != dataset.version:
+            return 'dataset'
+        if storage.get_submissions_state(conn)[0] != dataset.submissions[0]:
+            return 'submissions'
         return None
+    finally:
+        conn.close()
+
+async def refresh_dataset(application):
+    dataset = application.bot_data.get('dataset')
+    if dataset is not None:
+        changes = await asyncio.to_thread(dataset_changes, dataset)
+        if changes is None:
+            return
+        if changes == 'submissions':
+            application.bot_data['dataset'] = await asyncio.to_thread(update_submission_stats, dataset)
+            return
+    # Новый набор строится в отдельном потоке, обработчики до замены работают со старым
+    with DATASET_BUILD_SECONDS.time():
+        application.bot_data['dataset'] = await asyncio.to_thread(build_dataset)
+    DATASET_VERSION.set(application.bot_data['dataset'].version)
+    # file_id загруженных в Telegram графиков действительны только для своей версии данных
+    application.bot_data['chart_file_ids'] = {}
+    previous = application.bot_data.get('chart_prerender')
+    if previous:
+        previous.cancel()
+    application.bot_data['chart_prerender'] = asyncio.create_task(prerender_charts(application.bot_data))
+    logger.info(f"Данные о вакансиях загружены, версия {application.bot_data['dataset'].version}")
+
+async def watch_dataset(application):
+    while True:
+        await asyncio.sleep(DATASET_REFRESH_INTERVAL)
+        try:
+            await refresh_dataset(application)
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении данных о вакансиях: {e}")
+
+class ChartCache:
+    # LRU готовых PNG. Ключ включает версию данных, так что после обхода графики строятся заново.
+    # Одновременные запросы одного графика ждут один и тот же рендер.
+    def __init__(self, maxsize=CHART_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    async def get(self, key, render):
+        entry = self.entries.get(key)
+        CHART_CACHE_LOOKUPS.inc(result='miss' if entry is None else 'hit')
+        if entry is None:
+            entry = asyncio.ensure_future(render())
+            self.entries[key] = entry
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        try:
+            return await asyncio.shield(entry)
+        except Exception:
+            if self.entries.get(key) is entry:
+                del self.entries[key]
+            raise
+
+def create_chart_pool():
+    # forkserver: рабочие процессы не наследуют потоки и сокеты бота
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+    return ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=context)
+
+async def render_chart(bot_data, key, function, *args):
+    pool = bot_data['chart_pool']
+
+    async def render():
+        with CHART_RENDER_SECONDS.time():
+            return await asyncio.get_running_loop().run_in_executor(pool, function, *args)
+
+    return await bot_data['chart_cache'].get((*key, bot_data['dataset'].version), render)
+
+async def get_salary_chart(bot_data, region_salaries, profession, experience):
+    return await render_chart(
+        bot_data, (profession, experience), charts.render_salary_chart, region_salaries, profession, experience
+    )
+
+async def get_trend_chart(bot_data, dataset, profession, region_id):
+    # Архив меняется и без новой версии данных (archive.py rebuild, снимок после публикации региона),
+    # поэтому в ключе ещё и mtime архива, из которого взяты точки
+    return await render_chart(
+        bot_data, ('trend', profession, region_id, dataset.archive_mtime), charts.render_trend_chart,
+        dataset.trends[(region_id, profession)], profession, REGION_NAMES[region_id]
+    )
 
-def save_vacancy_to_csv(region_id, vacancy_data):
-    filename = f'{region_id}_vacancies.csv'
-    fieldnames = ['Название', 'Ссылка', 'Зарплата', 'Локация', 'Требования', 'Профессия', 'Опыт работы']
+async def prerender_charts(bot_data):
+    # После обновления данных графики рисуются заранее, начиная с самых запрашиваемых
+    dataset = bot_data['dataset']
+    popularity = bot_data.setdefault('chart_requests', Counter())
+    keys = sorted(dataset.salary_charts, key=lambda key: -popularity[key])
+    # Графиков динамики много (регион × профессия), заранее рисуются только уже запрошенные
+    trend_keys = [key for key, _ in popularity.most_common() if key[0] == 'trend']
     try:
-        with open(filename, 'a', encoding='utf-8', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writerow(vacancy_data)
+        for profession, experience in keys:
+            region_salaries = dataset.salary_charts[(profession, experience)]
+            if region_salaries:
+                await get_salary_chart(bot_data, region_salaries, profession, experience)
+        for _, profession, region_id in trend_keys:
+            if len(dataset.trends.get((region_id, profession), [])) >= 2:
+                await get_trend_chart(bot_data, dataset, profession, region_id)
     except Exception as e:
-        logger.error(f"Ошибка при записи в файл {filename}: {e}")
-
-def calculate_salary_range(vacancies):
-    salaries = []
-    for vacancy in vacancies:
-        salary = vacancy['Зарплата']
-        if salary and salary != 'Не указана':
-            parts = salary.split()
-            if len(parts) >= 3:
+        logger.error(f"Ошибка при подготовке графиков: {e}")
+
+def write_submissions(submissions):
+    conn = storage.connect()
+    try:
+        storage.add_submissions(conn, submissions)
+    finally:
+        conn.close()
+
+class SubmissionWriter:
+    # Отложенная запись зарплат пользователей: обработчик кладёт запись в очередь и сразу отвечает,
+    # фоновая задача собирает пачку и пишет её в базу в отдельном потоке, одной транзакцией.
+    # Пачка, которую не удалось записать, остаётся в очереди до следующей попытки.
+    # Остановка — через None в очереди, а не отмену задачи, чтобы не потерять пачку на полпути.
+    def __init__(self, batch=SUBMISSION_BATCH, delay=SUBMISSION_FLUSH_DELAY):
+        self.batch = batch
+        self.delay = delay
+        self.queue = asyncio.Queue()
+        self.pending = []
+        self.task = asyncio.create_task(self.run())
+
+    def put(self, region_id, submission):
+        self.queue.put_nowait((region_id, submission))
+
+    async def run(self):
+        # None в очереди — сигнал остановки: дописываем накопленное и выходим
+        closing = False
+        while not closing:
+            if not self.pending:
+                item = await self.queue.get()
+                if item is None:
+                    break
+                self.pending.append(item)
+            deadline = asyncio.get_running_loop().time() + self.delay
+            while len(self.pending) < self.batch:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
                 try:
-                    from_value = float(parts[0]) if parts[0] != 'None' else None
-                    to_value = float(parts[2]) if parts[2] != 'None' else None
-                    if from_value is not None and to_value is not None:
-                        avg_salary = (from_value + to_value) / 2
-                        salaries.append(avg_salary)
-                except ValueError:
-                    continue
-    if salaries:
-        return min(salaries), max(salaries), sum(salaries) / len(salaries)
-    return None, None, None
-
-def analyze_requirements(vacancies):
-    requirements = []
-    for vacancy in vacancies:
-        description = vacancy['Требования']
-        if description:
-            requirements.append(description.lower())
-
-    skills = [
-        'python', 'java', 'c++', 'c#', 'javascript', 'go', 'typescript', 
-        'security', 'cloud', 'networking', 'aws', 'azure', 'linux', 'docker', 
-        'kubernetes', 'git', 'ci/cd', 'sql', 'mongodb', 'postgresql', 
-        'api', 'rest', 'graphql', 'devops', 'microservices'
-    ]
-    skill_counts = Counter()
-
-    for req in requirements:
-        for skill in skills:
-            if skill in req:
-                skill_counts[skill] += 1
-
-    return skill_counts.most_common(5)
-
-def analyze_experience(vacancies):
-    experience_counts = Counter()
-    for vacancy in vacancies:
-        experience = vacancy.get('Опыт работы', 'Не указан')
-        experience_counts[experience] += 1
-    return experience_counts.most_common()
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                self.pending.append(item)
+            if closing:
+                # Последняя попытка записи, без повторов
+                while self.pending and await self.flush():
+                    pass
+            elif not await self.flush():
+                await asyncio.sleep(self.delay)
+
+    async def flush(self):
+        batch = self.pending[:self.batch]
+        try:
+            with SUBMISSION_FLUSH_SECONDS.time():
+                await asyncio.to_thread(write_submissions, batch)
+        except Exception as e:
+            logger.error(f"Ошибка при записи зарплат пользователей в базу {storage.DB_PATH}: {e}")
+            return False
+        del self.pending[:len(batch)]
+        SUBMISSIONS_WRITTEN.inc(len(batch))
+        return True
+
+    async def close(self):
+        # При остановке бота дописываем всё, что успели прислать
+        self.queue.put_nowait(None)
+        await self.task
 
 def generate_recommendations(common_skills, profession):
     if not common_skills:
@@ -171,248 +441,357 @@ def generate_recommendations(common_skills, profession):
     
     return "\n".join(result) if result else "Нет данных для рекомендаций."
 
-async def start(update: Update, context: CallbackContext) -> int:
-    await update.message.reply_text(
-        "Привет! Выбери режим работы:\n"
-        "1. Анализ вакансий по региону\n"
-        "2. Анализ зарплат категории по регионам\n\n"
-        "Введи номер режима (1 или 2)."
-    )
-    return CHOOSING_MODE
-
-async def choose_mode(update: Update, context: CallbackContext) -> int:
-    user_input = update.message.text.strip()
-    if user_input == '1':
-        await update.message.reply_text(
-            "Выбери вакансию из списка:\n"
-            "1. Кибербезопасность\n"
-            "2. DevSecOps\n"
-            "3. Пентестер\n"
-            "4. Антифрод-аналитик\n"
-            "5. Руководитель отдела информационной безопасности\n"
-            "6. Аналитик по расследованию компьютерных инцидентов\n"
-            "7. Архитектор информационной безопасности\n\n"
-            "Введи номер вакансии (1-7)."
-        )
-        return CHOOSING_VACANCY
-    elif user_input == '2':
-        await update.message.reply_text(
-            "Выбери специальность для анализа зарплат:\n"
-            "1. Кибербезопасность\n"
-            "2. DevSecOps\n"
-            "3. Пентестер\n"
-            "4. Антифрод-аналитик\n"
-            "5. Руководитель отдела информационной безопасности\n"
-            "6. Аналитик по расследованию компьютерных инцидентов\n"
-            "7. Архитектор информационной безопасности\n\n"
-            "Введи номер специальности (1-7)."
-        )
-        return CHOOSING_VACANCY_FOR_SALARY
-    else:
-        await update.message.reply_text("Пожалуйста, введи 1 или 2.")
-        return CHOOSING_MODE
-
-async def choose_vacancy(update: Update, context: CallbackContext) -> int:
-    user_input = update.message.text.strip()
-    if not user_input.isdigit() or int(user_input) < 1 or int(user_input) > 7:
-        await update.message.reply_text("Пожалуйста, введи номер вакансии от 1 до 7.")
-        return CHOOSING_VACANCY
-
-    vacancy_index = int(user_input) - 1
-    context.user_data['vacancy'] = VACANCIES[vacancy_index]
-
-    await update.message.reply_text(
-        "Теперь введи регион из доступных:\n"
-        "Москва, Санкт-Петербург, Екатеринбург, Новосибирск, Нижний Новгород, Казань, Челябинск, Самара, Омск, Ростов-на-Дону, Уфа, Красноярск."
-    )
-    return CHOOSING_REGION
-
-async def choose_region(update: Update, context: CallbackContext) -> int:
-    region = update.message.text.strip().lower()
-    if region not in regions:
-        await update.message.reply_text("Указанный регион не поддерживается. Пожалуйста, выбери регион из списка.")
-        return CHOOSING_REGION
-    context.user_data['region'] = region
-    region_id = regions[region]
-    vacancies = read_vacancies_from_csv(region_id)
-    if not vacancies:
-        await update.message.reply_text(f"Для региона {region.title()} нет данных о вакансиях.")
-        return ConversationHandler.END
-    selected_vacancy = context.user_data['vacancy']
-    filtered_vacancies = [v for v in vacancies if selected_vacancy.lower() in v['Профессия'].lower()]
-    if not filtered_vacancies:
-        await update.message.reply_text(f"В регионе {region.title()} нет вакансий по специальности '{selected_vacancy.title()}'.")
-        return ConversationHandler.END
-    min_salary, max_salary, avg_salary = calculate_salary_range(filtered_vacancies)
+def render_region_reply(dataset, profession, region_id):
+    # Режим 1: (текст ответа, следующее состояние диалога)
+    region = REGION_NAMES[region_id]
+    if not dataset.get(region_id):
+        return f"Для региона {region.title()} нет данных о вакансиях.", ConversationHandler.END
+    stats = dataset.get_stats(region_id, profession)
+    if not stats or not stats['vacancies']:
+        return f"В регионе {region.title()} нет вакансий по специальности '{profession.title()}'.", ConversationHandler.END
     salary_text = (
-        f"Минимальная зарплата: {min_salary:.2f} руб.\n"
-        f"Максимальная зарплата: {max_salary:.2f} руб.\n"
-        f"Средняя зарплата: {avg_salary:.2f} руб."
-    ) if min_salary is not None and max_salary is not None and avg_salary is not None else "Зарплата не указана."
+        f"Минимальная зарплата: {stats['salary_min']:.2f} руб.\n"
+        f"Максимальная зарплата: {stats['salary_max']:.2f} руб.\n"
+        f"Средняя зарплата: {stats['salary_mean']:.2f} руб.\n"
+        f"Медианная зарплата: {stats['salary_median']:.2f} руб."
+    ) if stats['salaries'] else "Зарплата не указана."
 
-    common_skills = analyze_requirements(filtered_vacancies)
-    experience_stats = analyze_experience(filtered_vacancies)
-    recommendations = generate_recommendations(common_skills, selected_vacancy)
+    common_skills = dataset.analyze_requirements(region_id, profession)
+    experience_stats = dataset.experience_counts[(region_id, profession)]
+    recommendations = generate_recommendations(common_skills, profession)
 
     experience_text = "Требуемый опыт работы:\n"
     for exp, count in experience_stats:
         experience_text += f"- {exp}: {count} вакансий\n"
 
-    await update.message.reply_text(
-        f"Специальность: {selected_vacancy.title()}\n"
+    return (
+        f"Специальность: {profession.title()}\n"
         f"Регион: {region.title()}\n"
-        f"Найдено вакансий: {len(filtered_vacancies)}\n\n"
+        f"Найдено вакансий: {stats['vacancies']}\n\n"
         f"{salary_text}\n\n"
         f"{experience_text}\n"
-        f"Рекомендации:\n{recommendations}"
-    )
-
-    await update.message.reply_text(
+        f"Рекомендации:\n{recommendations}\n\n"
         "Если хочешь помочь улучшить данные, укажи свою зарплату и опыт работы.\n"
         "Введи свою зарплату в формате 'от X до Y руб.' (например, 'от 80000 до 120000 руб.'):"
-    )
-    return ENTERING_SALARY
+    ), ENTERING_SALARY
+
+def salary_chart_data(dataset, profession, experience):
+    # Режим 2: средняя зарплата по регионам для графика, None — если данных нет
+    region_salaries = {}
+    for region_name, region_id in regions.items():
+        stats = dataset.get_stats(region_id, profession, experience)
+        if stats and stats['salaries']:
+            region_salaries[region_name] = stats['salary_mean']
+    return region_salaries or None
+
+async def answer_with_text(query, text, reply_markup=None):
+    # Ответ на нажатие и замена сообщения с кнопками уходят параллельно: одно ожидание вместо двух
+    await asyncio.gather(query.answer(), query.edit_message_text(text, reply_markup=reply_markup))
+
+def selected_index(query, options):
+    return int(query.data.split(':', 1)[1]) % len(options)
+
+async def start(update: Update, context: CallbackContext) -> int:
+    await update.message.reply_text("Привет! Выбери режим работы:", reply_markup=MODE_KEYBOARD)
+    return CHOOSING_MODE
+
+async def choose_mode(update: Update, context: CallbackContext) -> int:
+    query = update.callback_query
+    if query.data == 'mode:1':
+        await answer_with_text(query, "Выбери вакансию:", VACANCY_KEYBOARD)
+        return CHOOSING_VACANCY
+    if query.data == 'mode:3':
+        await answer_with_text(query, "Выбери специальность для динамики зарплат и спроса:", VACANCY_KEYBOARD)
+        return CHOOSING_VACANCY_FOR_TREND
+    await answer_with_text(query, "Выбери специальность для анализа зарплат:", VACANCY_KEYBOARD)
+    return CHOOSING_VACANCY_FOR_SALARY
+
+async def choose_vacancy(update: Update, context: CallbackContext) -> int:
+    query = update.callback_query
+    context.user_data['vacancy'] = VACANCIES[selected_index(query, VACANCIES)]
+    await answer_with_text(query, "Выбери регион:", REGION_KEYBOARD)
+    return CHOOSING_REGION
+
+async def choose_region(update: Update, context: CallbackContext) -> int:
+    query = update.callback_query
+    region_id = int(query.data.split(':', 1)[1])
+    if region_id not in REGION_NAMES:
+        await answer_with_text(query, "Указанный регион не поддерживается. Выбери регион из списка.", REGION_KEYBOARD)
+        return CHOOSING_REGION
+    context.user_data['region'] = REGION_NAMES[region_id]
+    text, next_state = context.bot_data['dataset'].region_replies[(context.user_data['vacancy'], region_id)]
+    await answer_with_text(query, text)
+    return next_state
 
 async def entering_salary(update: Update, context: CallbackContext) -> int:
     salary = update.message.text.strip()
+    if parse_salary_text(salary) == (None, None):
+        await update.message.reply_text(
+            "Не получилось разобрать зарплату. Введи сумму в рублях в месяц, от 10 тыс. до 10 млн, "
+            "например 'от 80000 до 120000 руб.' или '150к':"
+        )
+        return ENTERING_SALARY
     context.user_data['user_salary'] = salary
 
-    await update.message.reply_text(
-        "Теперь укажи свой опыт работы:\n"
-        "1. Нет опыта\n"
-        "2. От 1 года до 3 лет\n"
-        "3. От 3 до 6 лет\n"
-        "4. Более 6 лет\n\n"
-        "Введи номер опыта работы (1-4)."
-    )
+    await update.message.reply_text("Теперь укажи свой опыт работы:", reply_markup=EXPERIENCE_KEYBOARD)
     return ENTERING_EXPERIENCE
 
 async def entering_experience(update: Update, context: CallbackContext) -> int:
-    user_input = update.message.text.strip()
-    if not user_input.isdigit() or int(user_input) < 1 or int(user_input) > 4:
-        await update.message.reply_text("Пожалуйста, введи номер опыта работы от 1 до 4.")
-        return ENTERING_EXPERIENCE
-
-    experience_index = int(user_input) - 1
-    experience = EXPERIENCE_OPTIONS[experience_index]
+    query = update.callback_query
+    experience = EXPERIENCE_OPTIONS[selected_index(query, EXPERIENCE_OPTIONS)]
     context.user_data['user_experience'] = experience
 
-    region_id = regions[context.user_data['region']]
-    vacancy_data = {
-        'Название': f"Пользовательская вакансия ({context.user_data['vacancy']})",
-        'Ссылка': 'Не указана',
-        'Зарплата': context.user_data['user_salary'],
-        'Локация': context.user_data['region'].title(),
-        'Требования': 'Не указаны',
-        'Профессия': context.user_data['vacancy'],
-        'Опыт работы': experience
-    }
-    save_vacancy_to_csv(region_id, vacancy_data)
+    context.bot_data['submissions'].put(regions[context.user_data['region']], {
+        'profession': context.user_data['vacancy'],
+        'salary': context.user_data['user_salary'],
+        'experience': experience,
+    })
 
-    await update.message.reply_text(
-        "Спасибо! Твои данные сохранены. Они помогут улучшить анализ вакансий."
-    )
+    await answer_with_text(query, "Спасибо! Твои данные сохранены. Они помогут улучшить анализ вакансий.")
     return ConversationHandler.END
 
 async def choose_vacancy_for_salary(update: Update, context: CallbackContext) -> int:
-    user_input = update.message.text.strip()
-    if not user_input.isdigit() or int(user_input) < 1 or int(user_input) > 7:
-        await update.message.reply_text("Пожалуйста, введи номер специальности от 1 до 7.")
-        return CHOOSING_VACANCY_FOR_SALARY
-
-    vacancy_index = int(user_input) - 1
-    selected_vacancy = VACANCIES[vacancy_index]
-    context.user_data['vacancy'] = selected_vacancy
-
-    await update.message.reply_text(
-        "Выбери требуемый опыт работы:\n"
-        "1. Нет опыта\n"
-        "2. От 1 года до 3 лет\n"
-        "3. От 3 до 6 лет\n"
-        "4. Более 6 лет\n\n"
-        "Введи номер опыта работы (1-4)."
-    )
+    query = update.callback_query
+    context.user_data['vacancy'] = VACANCIES[selected_index(query, VACANCIES)]
+    await answer_with_text(query, "Выбери требуемый опыт работы:", EXPERIENCE_KEYBOARD)
     return CHOOSING_EXPERIENCE
 
 async def choose_experience(update: Update, context: CallbackContext) -> int:
-    user_input = update.message.text.strip()
-    if not user_input.isdigit() or int(user_input) < 1 or int(user_input) > 4:
-        await update.message.reply_text("Пожалуйста, введи номер опыта работы от 1 до 4.")
-        return CHOOSING_EXPERIENCE
-
-    experience_index = int(user_input) - 1
-    selected_experience = EXPERIENCE_OPTIONS[experience_index]
+    query = update.callback_query
+    selected_experience = EXPERIENCE_OPTIONS[selected_index(query, EXPERIENCE_OPTIONS)]
     context.user_data['experience'] = selected_experience
-
-    region_salaries = {}
-    for region_name, region_id in regions.items():
-        vacancies = read_vacancies_from_csv(region_id)
-        if vacancies:
-            filtered_vacancies = [
-                v for v in vacancies
-                if context.user_data['vacancy'].lower() in v['Профессия'].lower()
-                and v.get('Опыт работы', 'Не указан') == selected_experience
-            ]
-            if filtered_vacancies:
-                _, _, avg_salary = calculate_salary_range(filtered_vacancies)
-                if avg_salary is not None:
-                    region_salaries[region_name] = avg_salary
-
-        if not region_salaries:
-        await update.message.reply_text(
-            f"Нет данных о зарплатах для специальности '{context.user_data['vacancy'].title()}' "
+    profession = context.user_data['vacancy']
+
+    dataset = context.bot_data['dataset']
+    key = (profession, selected_experience)
+    context.bot_data.setdefault('chart_requests', Counter())[key] += 1
+    region_salaries = dataset.salary_charts[key]
+    if not region_salaries:
+        await answer_with_text(
+            query,
+            f"Нет данных о зарплатах для специальности '{profession.title()}' "
             f"с опытом работы '{selected_experience}'."
         )
         return ConversationHandler.END
 
-    plt.figure(figsize=(10, 6))
-    plt.bar(region_salaries.keys(), region_salaries.values(), color='skyblue')
-    plt.xlabel('Регион')
-    plt.ylabel('Средняя зарплата (руб)')
-    plt.title(
-        f'Средние зарплаты для специальности "{context.user_data["vacancy"].title()}"\n'
-        f'с опытом работы "{selected_experience}" по регионам'
+    await send_chart(
+        query, context, key,
+        lambda: get_salary_chart(context.bot_data, region_salaries, profession, selected_experience),
+        f"Средние зарплаты для специальности '{profession.title()}' "
+        f"с опытом работы '{selected_experience}' по регионам."
     )
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-
-    # Сохраняем график в буфер
-    buf = io.BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-
-    await update.message.reply_photo(
-        photo=buf,
-        caption=(
-            f"Средние зарплаты для специальности '{context.user_data['vacancy'].title()}' "
-            f"с опытом работы '{selected_experience}' по регионам."
+    return ConversationHandler.END
+
+async def choose_vacancy_for_trend(update: Update, context: CallbackContext) -> int:
+    query = update.callback_query
+    context.user_data['vacancy'] = VACANCIES[selected_index(query, VACANCIES)]
+    await answer_with_text(query, "Выбери регион:", REGION_KEYBOARD)
+    return CHOOSING_REGION_FOR_TREND
+
+async def choose_region_for_trend(update: Update, context: CallbackContext) -> int:
+    query = update.callback_query
+    region_id = int(query.data.split(':', 1)[1])
+    if region_id not in REGION_NAMES:
+        await answer_with_text(query, "Указанный регион не поддерживается. Выбери регион из списка.", REGION_KEYBOARD)
+        return CHOOSING_REGION_FOR_TREND
+    profession = context.user_data['vacancy']
+    region = REGION_NAMES[region_id]
+    dataset = context.bot_data['dataset']
+    points = dataset.trends.get((region_id, profession), [])
+    context.bot_data.setdefault('chart_requests', Counter())[('trend', profession, region_id)] += 1
+    if len(points) < 2:
+        await answer_with_text(
+            query,
+            f"Пока недостаточно истории для специальности '{profession.title()}' в регионе {region.title()}: "
+            "график появится после нескольких обходов."
         )
-    )
-    plt.close()
+        return ConversationHandler.END
 
+    await send_chart(
+        query, context, ('trend', profession, region_id),
+        lambda: get_trend_chart(context.bot_data, dataset, profession, region_id),
+        trend_caption(points, profession, region)
+    )
     return ConversationHandler.END
 
+def trend_caption(points, profession, region):
+    caption = f"Динамика для специальности '{profession.title()}' в регионе {region.title()}.\n"
+    first, last = points[0], points[-1]
+    since = time.strftime('%d.%m.%Y', time.localtime(first[0]))
+    caption += f"Вакансий: {first[1]} → {last[1]} с {since}."
+    salaries = [median for _, _, median in points if median is not None]
+    if len(salaries) >= 2:
+        change = (salaries[-1] - salaries[0]) / salaries[0] * 100
+        caption += f"\nМедианная зарплата: {salaries[0]:.0f} → {salaries[-1]:.0f} руб. ({change:+.1f}%)."
+    return caption
+
+async def send_chart(query, context, key, render, caption):
+    # Уже загруженный в Telegram график отправляется по file_id, без повторной загрузки PNG
+    dataset = context.bot_data['dataset']
+    file_ids = context.bot_data['chart_file_ids']
+    photo = file_ids.get(key)
+    if photo is None:
+        photo = await render()
+
+    _, message = await asyncio.gather(query.answer(), query.message.reply_photo(photo=photo, caption=caption))
+    if message.photo and context.bot_data['dataset'] is dataset:
+        file_ids[key] = message.photo[-1].file_id
+
 async def cancel(update: Update, context: CallbackContext) -> int:
     await update.message.reply_text("Диалог завершен.")
     return ConversationHandler.END
 
-def main():
-    application = Application.builder().token("*********************************************").build()
+async def expired_button(update: Update, context: CallbackContext) -> None:
+    # Кнопки сообщений из завершённых диалогов
+    await update.callback_query.answer("Меню устарело, начни заново: /start")
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    # Обновления разных пользователей обрабатываются параллельно, одного пользователя — строго по очереди:
+    # ConversationHandler хранит состояние по пользователю, и два его обновления не должны перемешаться.
+    # Ожидающие обновления не занимают слоты обработчиков: лимит max_in_flight берётся после блокировки пользователя.
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_pending=MAX_PENDING_UPDATES):
+        super().__init__(max(max_pending, max_in_flight))
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.slots = asyncio.Semaphore(max_in_flight)
+        # id пользователя -> [блокировка, число обновлений, ожидающих её или держащих]
+        self.user_locks = {}
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update, coroutine):
+        key = self.user_key(update)
+        entry = self.user_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        started = time.perf_counter()
+        try:
+            async with entry[0], self.slots:
+                UPDATE_WAIT_SECONDS.observe(time.perf_counter() - started)
+                self.in_flight += 1
+                UPDATES_IN_FLIGHT.set(self.in_flight)
+                try:
+                    await coroutine
+                finally:
+                    self.in_flight -= 1
+                    UPDATES_IN_FLIGHT.set(self.in_flight)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.user_locks[key]
+
+    @staticmethod
+    def user_key(update):
+        # Обновления без пользователя и чата (служебные) упорядочиваются одной общей очередью
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+def timed(handler):
+    # Время каждого обработчика — в гистограмму с именем обработчика (= состояния диалога)
+    return HANDLER_SECONDS.time(handler=handler.__name__)(handler)
+
+async def post_init(application):
+    metrics_port = application.bot_data.get('metrics_port', METRICS_PORT)
+    if metrics_port:
+        metrics.start_http_server(metrics_port, application.bot_data.get('metrics_host', metrics.METRICS_HOST))
+    application.bot_data['chart_pool'] = create_chart_pool()
+    application.bot_data['chart_cache'] = ChartCache()
+    application.bot_data['submissions'] = SubmissionWriter()
+    await refresh_dataset(application)
+    application.bot_data['dataset_watcher'] = asyncio.create_task(watch_dataset(application))
+
+async def post_shutdown(application):
+    submissions = application.bot_data.get('submissions')
+    if submissions:
+        await submissions.close()
+    for task_name in ('dataset_watcher', 'chart_prerender'):
+        task = application.bot_data.get(task_name)
+        if task:
+            task.cancel()
+    pool = application.bot_data.get('chart_pool')
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def build_application(token, request=None, max_in_flight=MAX_IN_FLIGHT, state_path=STATE_PATH):
+    # request подменяет HTTP-клиент Telegram Bot API (нагрузочный тест в benchmark.py);
+    # max_in_flight=1 — последовательная обработка, как у run_polling по умолчанию
+    builder = (
+        Application.builder().token(token).post_init(post_init).post_shutdown(post_shutdown)
+        .concurrent_updates(PerUserUpdateProcessor(max_in_flight))
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    if state_path:
+        # bot_data (пулы, кэши, задачи) не сохраняется: он собирается заново в post_init
+        builder = builder.persistence(PicklePersistence(
+            state_path,
+            store_data=PersistenceInput(bot_data=False, chat_data=False, callback_data=False),
+            update_interval=STATE_FLUSH_INTERVAL,
+        ))
+    application = builder.build()
+    # Диалог смешивает кнопки и ввод текста, поэтому состояние ведётся по пользователю, а не по сообщению
+    warnings.filterwarnings('ignore', message="If 'per_message=False'", category=PTBUserWarning)
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler('start', start)],
+        entry_points=[CommandHandler('start', timed(start))],
         states={
-            CHOOSING_MODE: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_mode)],
-            CHOOSING_VACANCY: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_vacancy)],
-            CHOOSING_REGION: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_region)],
-            CHOOSING_VACANCY_FOR_SALARY: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_vacancy_for_salary)],
-            CHOOSING_EXPERIENCE: [MessageHandler(filters.TEXT & ~filters.COMMAND, choose_experience)],
-            ENTERING_SALARY: [MessageHandler(filters.TEXT & ~filters.COMMAND, entering_salary)],
-            ENTERING_EXPERIENCE: [MessageHandler(filters.TEXT & ~filters.COMMAND, entering_experience)],
+            CHOOSING_MODE: [CallbackQueryHandler(timed(choose_mode), pattern=r'^mode:[123]$')],
+            CHOOSING_VACANCY: [CallbackQueryHandler(timed(choose_vacancy), pattern=r'^vacancy:\d+$')],
+            CHOOSING_REGION: [CallbackQueryHandler(timed(choose_region), pattern=r'^region:\d+$')],
+            CHOOSING_VACANCY_FOR_SALARY: [CallbackQueryHandler(timed(choose_vacancy_for_salary), pattern=r'^vacancy:\d+$')],
+            CHOOSING_EXPERIENCE: [CallbackQueryHandler(timed(choose_experience), pattern=r'^experience:\d+$')],
+            ENTERING_SALARY: [MessageHandler(filters.TEXT & ~filters.COMMAND, timed(entering_salary))],
+            ENTERING_EXPERIENCE: [CallbackQueryHandler(timed(entering_experience), pattern=r'^experience:\d+$')],
+            CHOOSING_VACANCY_FOR_TREND: [CallbackQueryHandler(timed(choose_vacancy_for_trend), pattern=r'^vacancy:\d+$')],
+            CHOOSING_REGION_FOR_TREND: [CallbackQueryHandler(timed(choose_region_for_trend), pattern=r'^region:\d+$')],
         },
-        fallbacks=[CommandHandler('cancel', cancel)],
+        fallbacks=[CommandHandler('cancel', timed(cancel))],
+        name='dialog',
+        persistent=bool(state_path),
     )
     application.add_handler(conv_handler)
-    application.run_polling()
+    application.add_handler(CallbackQueryHandler(expired_button))
+    return application
+
+def main():
+    parser = argparse.ArgumentParser(description='Telegram-бот HotSec')
+    parser.add_argument('--token', default=BOT_TOKEN, help='токен бота')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help='сколько обновлений обрабатывать одновременно; 1 — последовательно')
+    parser.add_argument('--metrics-port', type=int, default=METRICS_PORT,
+                        help='порт HTTP-эндпоинта /metrics; 0 — не поднимать')
+    parser.add_argument('--metrics-host', default=metrics.METRICS_HOST,
+                        help='адрес HTTP-эндпоинта /metrics; 0.0.0.0 — доступен извне')
+    parser.add_argument('--webhook-url', help='публичный HTTPS-адрес webhook; без него бот опрашивает getUpdates')
+    parser.add_argument('--listen', default=WEBHOOK_LISTEN, help='адрес локального HTTP-сервера webhook')
+    parser.add_argument('--port', type=int, default=WEBHOOK_PORT, help='порт локального HTTP-сервера webhook')
+    parser.add_argument('--url-path', default=WEBHOOK_PATH, help='путь, на который Telegram присылает обновления')
+    parser.add_argument('--secret-token', help='секрет в заголовке X-Telegram-Bot-Api-Secret-Token')
+    parser.add_argument('--state', default=STATE_PATH, help='файл состояния диалогов; пустая строка — не сохранять')
+    args = parser.parse_args()
+    if args.max_in_flight < 1:
+        parser.error('--max-in-flight должен быть не меньше 1')
+
+    application = build_application(args.token, max_in_flight=args.max_in_flight, state_path=args.state)
+    application.bot_data['metrics_port'] = args.metrics_port
+    application.bot_data['metrics_host'] = args.metrics_host
+    if args.webhook_url:
+        # TLS обычно завершает обратный прокси перед локальным сервером; Telegram шлёт на webhook_url
+        application.run_webhook(
+            listen=args.listen,
+            port=args.port,
+            url_path=args.url_path,
+            webhook_url=args.webhook_url,
+            secret_token=args.secret_token,
+        )
+    else:
+        application.run_polling()
 
 if __name__ == '__main__':
     main()
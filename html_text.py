@@ -0,0 +1,100 @@
+import html
+import re
+
+from bs4 import BeautifulSoup
+
+# Текст из HTML-описания вакансии без построения дерева BeautifulSoup: один проход регулярным
+# выражением по тегам, текст между ними — через html.unescape. Результат тот же, что у
+# BeautifulSoup(description, 'html.parser').get_text(separator); разметку, которую проход не разобрал
+# (незакрытые кавычки в атрибутах и т. п.), отдаём BeautifulSoup.
+
+# Заголовки раздела требований и признаки начала следующего раздела
+REQUIREMENTS_HEADINGS = ('требования', 'мы ждем', 'мы ждём', 'ожидаем', 'что мы ждем', 'что мы ждём')
+MAX_HEADING_LENGTH = 60
+BOLD_TAGS = {'b', 'strong', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+HEADER_TAGS = {'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+
+TOKEN_RE = re.compile(r'''
+    <!--.*?(?:-->|\Z)
+  | <(script|style)\b.*?</\1\s*>
+  | <(/?)([a-zA-Z][^\s/>]*)(?:"[^"]*"|'[^']*'|[^'">])*>
+  | <[!?][^>]*>
+''', re.S | re.I | re.X)
+# В тексте между тегами не должно остаться ничего похожего на тег
+MARKUP_RE = re.compile(r'<[a-zA-Z/!?]')
+
+
+class MarkupError(ValueError):
+    pass
+
+
+def iter_text(description):
+    # Текстовые узлы по порядку: (текст, тег выделения, в котором он стоит, или None)
+    bold = []
+    position = 0
+    for match in TOKEN_RE.finditer(description):
+        if match.start() > position:
+            yield text_node(description[position:match.start()]), bold[-1] if bold else None
+        position = match.end()
+        name = match.group(3)
+        if name is None:
+            continue
+        name = name.lower()
+        if name in BOLD_TAGS:
+            if match.group(2):
+                if name in bold:
+                    del bold[len(bold) - 1 - bold[::-1].index(name):]
+            elif not match.group(0).endswith('/>'):
+                bold.append(name)
+    if position < len(description):
+        yield text_node(description[position:]), bold[-1] if bold else None
+
+
+def text_node(chunk):
+    if MARKUP_RE.search(chunk):
+        raise MarkupError(chunk[:50])
+    return html.unescape(chunk)
+
+
+def soup_text(description, separator=''):
+    return BeautifulSoup(description, 'html.parser').get_text(separator)
+
+
+def html_to_text(description, separator=''):
+    # separator ставится между текстовыми узлами: без него пункты списка склеиваются ('PythonLinux')
+    if not description:
+        return ''
+    try:
+        return separator.join(text for text, _ in iter_text(description)).strip()
+    except MarkupError:
+        return soup_text(description, separator).strip()
+
+
+def is_heading(text, tag):
+    text = text.strip()
+    return bool(text) and len(text) <= MAX_HEADING_LENGTH and (tag in HEADER_TAGS or text.endswith(':'))
+
+
+def extract_section(description, headings=REQUIREMENTS_HEADINGS):
+    # Текст раздела от выделенного заголовка ('Требования:') до следующего заголовка; None, если раздела нет
+    if not description:
+        return None
+    try:
+        nodes = list(iter_text(description))
+    except MarkupError:
+        return None
+    section = None
+    for text, tag in nodes:
+        if tag is not None and text.strip():
+            title = text.strip().lower()
+            if section is None:
+                if len(title) <= MAX_HEADING_LENGTH and title.startswith(headings):
+                    section = []
+                continue
+            if is_heading(text, tag):
+                break
+        if section is not None:
+            section.append(text)
+    if section is None:
+        return None
+    return ''.join(section).strip(' :\n\t')
@@ -0,0 +1,161 @@
+import argparse
+import sqlite3
+import time
+import zlib
+from urllib.parse import urlencode
+
+# Кэш HTTP-ответов HH на диске: тело ответа (сжатое zlib) и валидаторы ETag / Last-Modified.
+# Повторный запрос уходит условным (If-None-Match / If-Modified-Since); на 304 тело берётся из кэша.
+# Размер ограничен max_bytes: при переполнении удаляются записи, к которым дольше всех не обращались.
+# В режиме offline сеть не используется: ответы только из кэша, чего нет — OfflineMiss.
+# Так правки разбора можно прогонять по уже скачанным ответам, не обращаясь к API.
+
+HTTP_CACHE_PATH = 'http_cache.sqlite'
+HTTP_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# После вытеснения кэш занимает не больше этой доли max_bytes, чтобы не чистить его на каждой записи
+EVICT_TO = 0.9
+COMPRESSION_LEVEL = 6
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    fetched REAL NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used);
+'''
+
+
+class OfflineMiss(LookupError):
+    pass
+
+
+def cache_key(url, params=None):
+    # Параметры в порядке имён: один и тот же запрос даёт один ключ
+    if not params:
+        return url
+    return f'{url}?{urlencode(sorted((name, str(value)) for name, value in params.items()))}'
+
+
+class ResponseCache:
+    def __init__(self, path=HTTP_CACHE_PATH, max_bytes=HTTP_CACHE_MAX_BYTES, offline=False):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offline = offline
+        # Кэш общий для шардов (--shard): WAL и короткие транзакции, как у кэша деталей
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        # Ответы 304, полные ответы, а в режиме offline — отданные из кэша и не найденные в нём
+        self.not_modified = 0
+        self.downloaded = 0
+        self.replayed = 0
+        self.missed = 0
+
+    def get(self, key):
+        # Запись кэша или None; обращение сдвигает запись в конец очереди на вытеснение
+        row = self.conn.execute('SELECT * FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        with self.conn:
+            self.conn.execute('UPDATE responses SET used = ? WHERE key = ?', (time.time(), key))
+        return row
+
+    @staticmethod
+    def validators(entry):
+        headers = {}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    @staticmethod
+    def body(entry):
+        return zlib.decompress(entry['body'])
+
+    def store(self, key, body, headers):
+        compressed = zlib.compress(body, COMPRESSION_LEVEL)
+        now = time.time()
+        with self.conn:
+            old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses (key, etag, last_modified, body, size, fetched, used) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, headers.get('ETag'), headers.get('Last-Modified'), compressed, len(compressed), now, now)
+            )
+        self.size += len(compressed) - (old['size'] if old else 0)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def revalidate(self, key, headers):
+        # 304: тело прежнее, сервер мог прислать новые валидаторы
+        with self.conn:
+            self.conn.execute(
+                'UPDATE responses SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), '
+                'fetched = ? WHERE key = ?',
+                (headers.get('ETag'), headers.get('Last-Modified'), time.time(), key)
+            )
+
+    def evict(self):
+        # Размер пересчитывается по базе: в неё пишут и другие шарды
+        with self.conn:
+            self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            target = self.max_bytes * EVICT_TO
+            if self.size <= target:
+                return 0
+            removed = 0
+            for row in self.conn.execute('SELECT key, size FROM responses ORDER BY used').fetchall():
+                if self.size <= target:
+                    break
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (row['key'],))
+                self.size -= row['size']
+                removed += 1
+        return removed
+
+    def close(self):
+        self.conn.close()
+
+
+def print_stats(cache):
+    count, oldest = cache.conn.execute('SELECT COUNT(*), MIN(fetched) FROM responses').fetchone()
+    age = f', самый старый ответ {(time.time() - oldest) / 3600:.1f} ч назад' if oldest else ''
+    print(f'Ответов в кэше: {count}, {cache.size / 1024 / 1024:.1f} МБ из {cache.max_bytes / 1024 / 1024:.0f} МБ{age}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Кэш HTTP-ответов HH')
+    parser.add_argument('--cache', default=HTTP_CACHE_PATH, help='путь к базе кэша')
+    parser.add_argument('--max-mb', type=int, default=HTTP_CACHE_MAX_BYTES // 1024 // 1024,
+                        help='предельный размер кэша, МБ')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('stats', help='число и объём сохранённых ответов')
+    subparsers.add_parser('evict', help='вытеснить давно не использованные ответы до предельного размера')
+    subparsers.add_parser('clear', help='удалить все ответы')
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.cache, args.max_mb * 1024 * 1024)
+    try:
+        if args.command == 'stats':
+            print_stats(cache)
+        elif args.command == 'evict':
+            print(f'Удалено ответов: {cache.evict()}')
+        elif args.command == 'clear':
+            with cache.conn:
+                cache.conn.execute('DELETE FROM responses')
+            cache.conn.execute('VACUUM')
+            print('Кэш очищен')
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+import argparse
+import sqlite3
+import time
+
+# Расписание обхода по регионам для hh_parser.py --schedule. У каждого региона свой интервал:
+# по итогам обхода оценивается скорость изменений (доля новых, изменившихся и исчезнувших вакансий
+# в час), и регион обходится тогда, когда в нём успело измениться примерно TARGET_CHANGE вакансий.
+# Запуски разнесены во времени не меньше чем на MIN_SPACING. Состояние хранится в SQLite
+# и переживает перезапуск; 'python scheduler.py trigger москва' ставит регион в начало очереди.
+# Новые регионы распределяются по первым суткам; чтобы сразу заполнить пустую базу —
+# 'python scheduler.py trigger' без аргументов.
+
+SCHEDULE_PATH = 'scheduler.sqlite'
+TARGET_CHANGE = 0.05
+MIN_INTERVAL = 60 * 60
+MAX_INTERVAL = 48 * 60 * 60
+DEFAULT_INTERVAL = 24 * 60 * 60
+# Вес нового наблюдения в скользящем среднем скорости изменений
+RATE_SMOOTHING = 0.5
+MIN_SPACING = 5 * 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS schedule (
+    region_id INTEGER PRIMARY KEY,
+    region_name TEXT NOT NULL,
+    interval REAL NOT NULL,
+    next_run REAL NOT NULL,
+    last_run REAL,
+    started REAL,
+    change_rate REAL,
+    vacancies INTEGER
+);
+'''
+
+
+def connect(path=SCHEDULE_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def find_slot(conn, region_id, when):
+    # Ближайшее время не раньше when, отстоящее от запусков других регионов на MIN_SPACING
+    taken = sorted(row[0] for row in conn.execute(
+        'SELECT next_run FROM schedule WHERE region_id != ?', (region_id,)
+    ))
+    for next_run in taken:
+        if next_run - MIN_SPACING < when < next_run + MIN_SPACING:
+            when = next_run + MIN_SPACING
+    return when
+
+
+def sync_regions(conn, regions):
+    # Новые регионы равномерно распределяются по первым суткам, исчезнувшие из конфигурации удаляются
+    now = time.time()
+    known = {row['region_id'] for row in conn.execute('SELECT region_id FROM schedule')}
+    new_regions = [(name, region_id) for name, region_id in regions.items() if region_id not in known]
+    with conn:
+        for index, (region_name, region_id) in enumerate(new_regions):
+            when = find_slot(conn, region_id, now + DEFAULT_INTERVAL * index / len(new_regions))
+            conn.execute(
+                'INSERT INTO schedule (region_id, region_name, interval, next_run) VALUES (?, ?, ?, ?)',
+                (region_id, region_name, DEFAULT_INTERVAL, when)
+            )
+        conn.executemany(
+            'DELETE FROM schedule WHERE region_id = ?',
+            ((region_id,) for region_id in known - set(regions.values()))
+        )
+
+
+def next_due(conn):
+    return conn.execute('SELECT * FROM schedule ORDER BY next_run LIMIT 1').fetchone()
+
+
+def mark_started(conn, region_id):
+    with conn:
+        conn.execute('UPDATE schedule SET started = ? WHERE region_id = ?', (time.time(), region_id))
+
+
+def record_run(conn, region_id, vacancies, changed):
+    # changed — новые, изменившиеся и исчезнувшие вакансии с прошлого обхода региона
+    row = conn.execute('SELECT * FROM schedule WHERE region_id = ?', (region_id,)).fetchone()
+    now = time.time()
+    interval = row['interval']
+    change_rate = row['change_rate']
+    if row['last_run'] is not None:
+        hours = max(now - row['last_run'], 60) / 3600
+        observed = changed / max(vacancies, 1) / hours
+        change_rate = observed if change_rate is None else (
+            RATE_SMOOTHING * observed + (1 - RATE_SMOOTHING) * change_rate
+        )
+        interval = MAX_INTERVAL if change_rate <= 0 else TARGET_CHANGE / change_rate * 3600
+        interval = min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+    with conn:
+        conn.execute(
+            'UPDATE schedule SET interval = ?, next_run = ?, last_run = ?, started = NULL, change_rate = ?, '
+            'vacancies = ? WHERE region_id = ?',
+            (interval, find_slot(conn, region_id, now + interval), now, change_rate, vacancies, region_id)
+        )
+    return interval
+
+
+def record_failure(conn, region_id, retry_in=MIN_INTERVAL):
+    with conn:
+        conn.execute(
+            'UPDATE schedule SET next_run = ?, started = NULL WHERE region_id = ?',
+            (find_slot(conn, region_id, time.time() + retry_in), region_id)
+        )
+
+
+def trigger(conn, region_ids):
+    # Запустить сейчас: срок в прошлом ставит регион первым в очереди
+    with conn:
+        conn.executemany(
+            'UPDATE schedule SET next_run = ? WHERE region_id = ?',
+            ((time.time() - 1, region_id) for region_id in region_ids)
+        )
+
+
+def print_status(conn):
+    now = time.time()
+    for row in conn.execute('SELECT * FROM schedule ORDER BY next_run'):
+        rate = '—' if row['change_rate'] is None else f'{row["change_rate"] * 100:.2f}%/ч'
+        print(f'{row["region_name"]:>18}: через {max(row["next_run"] - now, 0) / 3600:5.1f} ч, '
+              f'интервал {row["interval"] / 3600:5.1f} ч, изменения {rate}, вакансий {row["vacancies"] or 0}')
+
+
+def main():
+    import hh_parser
+
+    parser = argparse.ArgumentParser(description='Расписание обхода регионов')
+    parser.add_argument('--schedule', default=SCHEDULE_PATH, help='путь к базе расписания')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help='очередь регионов и их интервалы')
+    trigger_parser = subparsers.add_parser('trigger', help='обойти регионы в первую очередь')
+    trigger_parser.add_argument('regions', nargs='*', help='названия регионов; без аргументов — все')
+    args = parser.parse_args()
+
+    conn = connect(args.schedule)
+    sync_regions(conn, hh_parser.regions)
+    if args.command == 'status':
+        print_status(conn)
+    elif args.command == 'trigger':
+        names = args.regions or list(hh_parser.regions)
+        unknown = [name for name in names if name.lower() not in hh_parser.regions]
+        if unknown:
+            parser.error(f'неизвестные регионы: {", ".join(unknown)}')
+        trigger(conn, [hh_parser.regions[name.lower()] for name in names])
+        print(f'Поставлено в очередь регионов: {len(names)}')
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
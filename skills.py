@@ -0,0 +1,144 @@
+import json
+import os
+
+# Поиск навыков в тексте вакансии за один проход автоматом Ахо — Корасик.
+# Совпадение засчитывается только на границах слова: 'go' не находится в 'google', 'git' — в 'digital'.
+# Переход между латиницей и кириллицей тоже считается границей: get_text() склеивает пункты списка
+# ('Опыт работы с SQLОпыт работы с Go'), как и переход между буквой и цифрой ('Python3', 'Java8').
+# Алиас со звёздочкой на конце ('микросервис*') совпадает и с началом более длинного слова.
+
+SKILLS_PATH = 'skills.json'
+
+# Навык -> написания, по которым он ищется. Порядок навыков — порядок тегов в строке вакансии.
+DEFAULT_SKILLS = {
+    'python': ['python', 'питон'],
+    'java': ['java'],
+    'c++': ['c++', 'cpp'],
+    'c#': ['c#', '.net'],
+    'javascript': ['javascript', 'js'],
+    'go': ['go', 'golang'],
+    'typescript': ['typescript'],
+    'security': ['security'],
+    'cloud': ['cloud', 'облачн*'],
+    'networking': ['networking', 'tcp/ip', 'сетевые технологии', 'сетевых технологий'],
+    'aws': ['aws', 'amazon web services'],
+    'azure': ['azure'],
+    'linux': ['linux', 'unix'],
+    'docker': ['docker'],
+    'kubernetes': ['kubernetes', 'k8s'],
+    'git': ['git'],
+    'ci/cd': ['ci/cd', 'cicd', 'ci cd'],
+    'sql': ['sql', 'mysql'],
+    'mongodb': ['mongodb', 'mongo'],
+    'postgresql': ['postgresql', 'postgres'],
+    'api': ['api'],
+    'rest': ['rest', 'restful'],
+    'graphql': ['graphql'],
+    'devops': ['devops'],
+    'microservices': ['microservices', 'микросервис*'],
+}
+
+
+def load_skill_dictionary(path=SKILLS_PATH):
+    # skills.json дополняет словарь: новые навыки добавляются в конец, для известных заменяются алиасы
+    dictionary = {skill: list(aliases) for skill, aliases in DEFAULT_SKILLS.items()}
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as file:
+            dictionary.update(json.load(file))
+    return dictionary
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+
+def is_cyrillic(char):
+    return '\u0400' <= char <= '\u04ff'
+
+
+def char_class(char):
+    if char.isdigit():
+        return 'digit'
+    return 'cyrillic' if is_cyrillic(char) else 'latin'
+
+
+def joins(left, right):
+    # Символы относятся к одному слову: оба буквенно-цифровые и одного класса — латиница, кириллица или цифры
+    if not (is_word_char(left) and is_word_char(right)):
+        return False
+    return char_class(left) == char_class(right)
+
+
+class SkillMatcher:
+    def __init__(self, dictionary):
+        self.skills = list(dictionary)
+        self.order = {skill: index for index, skill in enumerate(self.skills)}
+        # Узел автомата: переходы, ссылка неудачи, список (навык, длина алиаса, нужна ли граница справа)
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for skill, aliases in dictionary.items():
+            for alias in aliases:
+                self.add_pattern(skill, alias.lower())
+        self.build_links()
+
+    def add_pattern(self, skill, alias):
+        prefix = alias.endswith('*')
+        alias = alias.rstrip('*')
+        node = 0
+        for char in alias:
+            if char not in self.transitions[node]:
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+                self.transitions[node][char] = len(self.transitions) - 1
+            node = self.transitions[node][char]
+        self.outputs[node].append((skill, len(alias), not prefix))
+
+    def build_links(self):
+        queue = list(self.transitions[0].values())
+        for node in queue:
+            for char, child in self.transitions[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find(self, text):
+        if not text:
+            return []
+        text = text.lower()
+        found = set()
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self.transitions[node]:
+                node = self.fail[node]
+            node = self.transitions[node].get(char, 0)
+            for skill, length, right_boundary in self.outputs[node]:
+                if skill in found:
+                    continue
+                start = end - length + 1
+                if start > 0 and joins(text[start - 1], text[start]):
+                    continue
+                if right_boundary and end + 1 < len(text) and joins(text[end], text[end + 1]):
+                    continue
+                found.add(skill)
+        return sorted(found, key=self.order.__getitem__)
+
+
+_matcher = None
+
+
+def get_matcher():
+    global _matcher
+    if _matcher is None:
+        _matcher = SkillMatcher(load_skill_dictionary())
+    return _matcher
+
+
+def extract_skills(text):
+    return get_matcher().find(text)
@@ -0,0 +1,664 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+import analytics
+import skills
+
+# Общее хранилище вакансий для hh_parser.py и hotsec_bot.py (SQLite в режиме WAL):
+# парсер атомарно заменяет данные региона, бот читает их индексированными запросами.
+# Зарплаты, присланные пользователями бота, хранятся отдельно (таблица submissions): обход их
+# не затирает, в агрегаты зарплат они входят наравне с вакансиями, а в число вакансий — нет.
+
+DB_PATH = 'vacancies.db'
+PROFESSION_SEPARATOR = '; '
+SKILL_SEPARATOR = ', '
+# Строка агрегатов по всем уровням опыта
+ANY_EXPERIENCE = '*'
+# Порядковый номер совпадения в staging: номер поиска * шаг + позиция в выдаче
+HIT_ORDINAL_STEP = 100000
+
+# Курсы для приведения зарплат к рублям: сколько рублей за единицу валюты (коды валют HH).
+# Значения по умолчанию примерные; актуальные кладутся в currency_rates.json рядом с базой.
+CURRENCY_RATES_PATH = 'currency_rates.json'
+DEFAULT_CURRENCY_RATES = {
+    'RUR': 1.0,
+    'USD': 90.0,
+    'EUR': 100.0,
+    'KZT': 0.19,
+    'BYR': 28.0,
+    'UAH': 2.2,
+    'UZS': 0.0072,
+    'AZN': 53.0,
+    'GEL': 33.0,
+    'KGS': 1.03,
+}
+# Числовые поля зарплаты, добавленные к таблице vacancies после первой версии схемы
+SALARY_COLUMNS = {
+    'salary_from': 'REAL',
+    'salary_to': 'REAL',
+    'currency': 'TEXT',
+    'gross': 'INTEGER',
+    'salary_rub': 'REAL',
+}
+# Все колонки, которых может не быть в старых базах
+ADDED_COLUMNS = dict(SALARY_COLUMNS, skills='TEXT')
+
+# Колонки старых CSV-файлов и соответствующие поля базы
+CSV_COLUMNS = {
+    'Название': 'name',
+    'Ссылка': 'url',
+    'Зарплата': 'salary',
+    'Локация': 'location',
+    'Требования': 'requirements',
+    'Профессия': 'professions',
+    'Опыт работы': 'experience',
+    'Тип работы': 'work_type',
+}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS vacancies (
+    id INTEGER PRIMARY KEY,
+    hh_id TEXT,
+    source TEXT NOT NULL DEFAULT 'hh',
+    region_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    url TEXT,
+    salary TEXT,
+    salary_from REAL,
+    salary_to REAL,
+    currency TEXT,
+    gross INTEGER,
+    salary_rub REAL,
+    location TEXT,
+    requirements TEXT,
+    skills TEXT,
+    experience TEXT,
+    work_type TEXT
+);
+CREATE INDEX IF NOT EXISTS vacancies_region ON vacancies (region_id, experience);
+CREATE INDEX IF NOT EXISTS vacancies_experience ON vacancies (experience);
+CREATE TABLE IF NOT EXISTS vacancy_professions (
+    profession TEXT NOT NULL,
+    vacancy_id INTEGER NOT NULL REFERENCES vacancies (id) ON DELETE CASCADE,
+    PRIMARY KEY (profession, vacancy_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS vacancy_professions_vacancy ON vacancy_professions (vacancy_id);
+CREATE TABLE IF NOT EXISTS salary_stats (
+    region_id INTEGER NOT NULL,
+    profession TEXT NOT NULL,
+    experience TEXT NOT NULL,
+    vacancies INTEGER NOT NULL,
+    salaries INTEGER NOT NULL,
+    salary_min REAL,
+    salary_max REAL,
+    salary_mean REAL,
+    salary_p25 REAL,
+    salary_median REAL,
+    salary_p75 REAL,
+    PRIMARY KEY (region_id, profession, experience)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS staging_searches (
+    region_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL,
+    PRIMARY KEY (region_id, ordinal)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS staging_hits (
+    region_id INTEGER NOT NULL,
+    hh_id TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    PRIMARY KEY (region_id, hh_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS staging_professions (
+    region_id INTEGER NOT NULL,
+    hh_id TEXT NOT NULL,
+    profession TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    PRIMARY KEY (region_id, hh_id, profession)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS staging_rows (
+    region_id INTEGER NOT NULL,
+    hh_id TEXT NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (region_id, hh_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS crawl_checkpoint (
+    region_id INTEGER PRIMARY KEY,
+    vacancies INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    region_id INTEGER NOT NULL,
+    profession TEXT NOT NULL,
+    salary TEXT,
+    salary_from REAL,
+    salary_to REAL,
+    currency TEXT,
+    salary_rub REAL,
+    experience TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_region ON submissions (region_id);
+'''
+
+
+def connect(path=DB_PATH):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # WAL: бот читает последнюю зафиксированную версию, пока парсер пишет новую
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA foreign_keys=ON')
+    conn.executescript(SCHEMA)
+    migrate_schema(conn)
+    migrate_submissions(conn)
+    return conn
+
+
+def database_path(conn):
+    # Файл базы, с которой открыто соединение, — для сообщений парсера
+    return conn.execute('PRAGMA database_list').fetchone()['file']
+
+
+def migrate_schema(conn):
+    # Старые базы: добавляем недостающие колонки и заполняем их из строки 'Зарплата' и текста требований
+    existing = {row['name'] for row in conn.execute('PRAGMA table_info(vacancies)')}
+    missing = [column for column in ADDED_COLUMNS if column not in existing]
+    if not missing:
+        return
+    rates = load_currency_rates()
+    with conn:
+        for column in missing:
+            conn.execute(f'ALTER TABLE vacancies ADD COLUMN {column} {ADDED_COLUMNS[column]}')
+        for row in conn.execute('SELECT id, salary, requirements FROM vacancies').fetchall():
+            if 'salary_rub' in missing:
+                salary_from, salary_to, currency = analytics.parse_salary(row['salary'])
+                conn.execute(
+                    'UPDATE vacancies SET salary_from = ?, salary_to = ?, currency = ?, salary_rub = ? WHERE id = ?',
+                    (salary_from, salary_to, currency, analytics.salary_to_rub(salary_from, salary_to, currency, rates),
+                     row['id'])
+                )
+            if 'skills' in missing:
+                conn.execute(
+                    'UPDATE vacancies SET skills = ? WHERE id = ?',
+                    (SKILL_SEPARATOR.join(skills.extract_skills(row['requirements'])), row['id'])
+                )
+        for (region_id,) in conn.execute('SELECT DISTINCT region_id FROM vacancies').fetchall():
+            rebuild_region_stats(conn, region_id)
+        bump_dataset_version(conn)
+
+
+def migrate_submissions(conn):
+    # Пользовательские строки из vacancies (source='user', прежние версии бота) переезжают в submissions
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'submissions_migrated'").fetchone():
+        return
+    with conn:
+        conn.execute('''
+            INSERT INTO submissions (region_id, profession, salary, salary_from, salary_to, currency, salary_rub,
+                                     experience, created)
+            SELECT v.region_id, p.profession, v.salary, v.salary_from, v.salary_to, v.currency, v.salary_rub,
+                   v.experience, ?
+            FROM vacancies v JOIN vacancy_professions p ON p.vacancy_id = v.id
+            WHERE v.source = 'user'
+        ''', (time.time(),))
+        if conn.execute("DELETE FROM vacancies WHERE source = 'user'").rowcount:
+            bump_dataset_version(conn)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('submissions_migrated', 1)")
+
+
+_currency_rates = None
+
+
+def load_currency_rates():
+    global _currency_rates
+    if _currency_rates is None:
+        _currency_rates = dict(DEFAULT_CURRENCY_RATES)
+        if os.path.exists(CURRENCY_RATES_PATH):
+            with open(CURRENCY_RATES_PATH, 'r', encoding='utf-8') as file:
+                _currency_rates.update(json.load(file))
+    return _currency_rates
+
+
+def normalize_experience(experience):
+    # HH пишет 'Нет опыта', бот предлагает 'нет опыта' — храним в одном виде
+    if not experience:
+        return 'Не указан'
+    return experience.strip().capitalize()
+
+
+def insert_vacancy(conn, region_id, record, source):
+    salary_from, salary_to, currency = record.get('salary_from'), record.get('salary_to'), record.get('currency')
+    gross = record.get('gross')
+    cursor = conn.execute(
+        'INSERT INTO vacancies (hh_id, source, region_id, name, url, salary, salary_from, salary_to, currency, gross, '
+        'salary_rub, location, requirements, skills, experience, work_type) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (
+            record.get('hh_id'), source, region_id, record['name'], record.get('url'), record.get('salary'),
+            salary_from, salary_to, currency, None if gross is None else int(gross),
+            analytics.salary_to_rub(salary_from, salary_to, currency, load_currency_rates()),
+            record.get('location'), record.get('requirements'), SKILL_SEPARATOR.join(record.get('skills') or []),
+            normalize_experience(record.get('experience')), record.get('work_type'),
+        )
+    )
+    conn.executemany(
+        'INSERT OR IGNORE INTO vacancy_professions (profession, vacancy_id) VALUES (?, ?)',
+        ((profession, cursor.lastrowid) for profession in record['professions'])
+    )
+
+
+def bump_dataset_version(conn):
+    # Версия данных растёт с каждой записью: по ней бот узнаёт, что кэш пора перестроить
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('dataset_version', 1) "
+        "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+    )
+
+
+def get_dataset_version(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'dataset_version'").fetchone()
+    return row[0] if row else 0
+
+
+def bump_submissions_version(conn):
+    # Отдельная версия для зарплат пользователей: они меняют только агрегаты своих регионов,
+    # и бот обновляет эти строки, не перезагружая вакансии и не перерисовывая графики
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('submissions_version', 1) "
+        "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+    )
+
+
+def get_submissions_state(conn):
+    # (версия зарплат пользователей, id последней записи)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'submissions_version'").fetchone()
+    last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM submissions').fetchone()[0]
+    return row[0] if row else 0, last_id
+
+
+def rebuild_region_stats(conn, region_id):
+    # Агрегаты по (регион, профессия, опыт) пересчитываются в той же транзакции, что и запись
+    # вакансий, поэтому всегда соответствуют данным, которые видит бот.
+    # vacancies — только вакансии с hh.ru; зарплаты пользователей добавляются к зарплатам группы.
+    counts = defaultdict(int)
+    groups = defaultdict(list)
+    rows = conn.execute('''
+        SELECT v.salary_rub, v.experience, p.profession, 1 AS vacancy
+        FROM vacancies v JOIN vacancy_professions p ON p.vacancy_id = v.id
+        WHERE v.region_id = ?
+        UNION ALL
+        SELECT salary_rub, experience, profession, 0 AS vacancy FROM submissions
+        WHERE region_id = ? AND salary_rub BETWEEN ? AND ?
+    ''', (region_id, region_id, analytics.USER_SALARY_MIN, analytics.USER_SALARY_MAX))
+    for row in rows:
+        for experience in (row['experience'], ANY_EXPERIENCE):
+            counts[(row['profession'], experience)] += row['vacancy']
+            groups[(row['profession'], experience)].append(row['salary_rub'])
+
+    conn.execute('DELETE FROM salary_stats WHERE region_id = ?', (region_id,))
+    for (profession, experience), salaries in groups.items():
+        values = [value for value in salaries if value is not None]
+        summary = analytics.salary_summary(values) or {}
+        conn.execute(
+            'INSERT INTO salary_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                region_id, profession, experience, counts[(profession, experience)], len(values), summary.get('min'),
+                summary.get('max'), summary.get('mean'), summary.get('p25'), summary.get('median'), summary.get('p75'),
+            )
+        )
+
+
+def rebuild_stats(conn):
+    with conn:
+        region_ids = [row[0] for row in conn.execute('SELECT DISTINCT region_id FROM vacancies')]
+        conn.execute('DELETE FROM salary_stats')
+        for region_id in region_ids:
+            rebuild_region_stats(conn, region_id)
+        bump_dataset_version(conn)
+
+
+def write_region(conn, region_id, records):
+    conn.execute("DELETE FROM vacancies WHERE region_id = ? AND source = 'hh'", (region_id,))
+    count = 0
+    for record in records:
+        insert_vacancy(conn, region_id, record, 'hh')
+        count += 1
+    rebuild_region_stats(conn, region_id)
+    bump_dataset_version(conn)
+    return count
+
+
+def replace_region(conn, region_id, records):
+    # Одна транзакция: читатели видят либо старые, либо новые данные региона целиком
+    with conn:
+        return write_region(conn, region_id, records)
+
+
+# Staging незавершённого обхода. Результаты поиска и готовые строки пишутся сюда по мере получения,
+# поэтому парсер не держит регион в памяти, а после перезапуска продолжает с того же места.
+# staging_hits — найденные вакансии (краткое описание из поиска), staging_rows — обработанные строки
+# без профессий: профессии вакансии собираются из всех поисков и добавляются при публикации.
+
+def begin_sweep(conn, max_age, fresh=False):
+    # Продолжаем обход, начатый не раньше max_age секунд назад; возвращает уже опубликованные регионы
+    row = conn.execute("SELECT value FROM meta WHERE key = 'sweep_started'").fetchone()
+    if row and not fresh and time.time() - row[0] < max_age:
+        return {region_id for (region_id,) in conn.execute('SELECT region_id FROM crawl_checkpoint')}
+    with conn:
+        clear_staging(conn)
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('sweep_started', ?)", (int(time.time()),)
+        )
+    return set()
+
+
+def finish_sweep(conn):
+    with conn:
+        clear_staging(conn)
+        conn.execute("DELETE FROM meta WHERE key = 'sweep_started'")
+
+
+def clear_staging(conn, region_id=None):
+    for table in ('staging_searches', 'staging_hits', 'staging_professions', 'staging_rows', 'crawl_checkpoint'):
+        if region_id is None:
+            conn.execute(f'DELETE FROM {table}')
+        elif table != 'crawl_checkpoint':
+            conn.execute(f'DELETE FROM {table} WHERE region_id = ?', (region_id,))
+
+
+def staged_searches(conn, region_id):
+    return {ordinal for (ordinal,) in conn.execute('SELECT ordinal FROM staging_searches WHERE region_id = ?', (region_id,))}
+
+
+def stage_search(conn, region_id, ordinal, profession, vacancies):
+    # Записывает результат одного поиска; возвращает вакансии, которых в staging региона ещё не было
+    new_vacancies = []
+    with conn:
+        for position, vacancy in enumerate(vacancies):
+            hit_ordinal = ordinal * HIT_ORDINAL_STEP + position
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO staging_hits (region_id, hh_id, ordinal, summary) VALUES (?, ?, ?, ?)',
+                (region_id, vacancy['id'], hit_ordinal, json.dumps(vacancy, ensure_ascii=False))
+            )
+            if cursor.rowcount:
+                new_vacancies.append(vacancy)
+            else:
+                conn.execute(
+                    'UPDATE staging_hits SET ordinal = MIN(ordinal, ?) WHERE region_id = ? AND hh_id = ?',
+                    (hit_ordinal, region_id, vacancy['id'])
+                )
+            conn.execute(
+                'INSERT INTO staging_professions (region_id, hh_id, profession, ordinal) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (region_id, hh_id, profession) DO UPDATE SET ordinal = MIN(ordinal, excluded.ordinal)',
+                (region_id, vacancy['id'], profession, hit_ordinal)
+            )
+        conn.execute('INSERT OR IGNORE INTO staging_searches (region_id, ordinal) VALUES (?, ?)', (region_id, ordinal))
+    return new_vacancies
+
+
+def pending_hits(conn, region_id):
+    # Найденные, но ещё не обработанные вакансии: их детали нужно запросить после перезапуска
+    rows = conn.execute('''
+        SELECT summary FROM staging_hits h
+        WHERE region_id = ? AND NOT EXISTS (
+            SELECT 1 FROM staging_rows r WHERE r.region_id = h.region_id AND r.hh_id = h.hh_id
+        )
+        ORDER BY ordinal
+    ''', (region_id,))
+    return [json.loads(summary) for (summary,) in rows]
+
+
+def staged_hit_ids(conn, region_id):
+    return [hh_id for (hh_id,) in conn.execute('SELECT hh_id FROM staging_hits WHERE region_id = ?', (region_id,))]
+
+
+def stage_row(conn, region_id, record):
+    # Без commit: вызывающий фиксирует строки пачками
+    conn.execute(
+        'INSERT OR REPLACE INTO staging_rows (region_id, hh_id, body) VALUES (?, ?, ?)',
+        (region_id, record['hh_id'], json.dumps(record, ensure_ascii=False))
+    )
+
+
+def staged_records(conn, region_id):
+    # Строки в порядке первого появления в поиске, профессии — в порядке поисков, как в последовательном обходе
+    # Курсор читается по одной строке: вставки в vacancies идут в той же транзакции, без commit
+    rows = conn.execute('''
+        SELECT h.hh_id, r.body FROM staging_hits h
+        JOIN staging_rows r ON r.region_id = h.region_id AND r.hh_id = h.hh_id
+        WHERE h.region_id = ?
+        ORDER BY h.ordinal
+    ''', (region_id,))
+    for hh_id, body in rows:
+        record = json.loads(body)
+        record['professions'] = [profession for (profession,) in conn.execute(
+            'SELECT profession FROM staging_professions WHERE region_id = ? AND hh_id = ? ORDER BY ordinal',
+            (region_id, hh_id)
+        )]
+        yield record
+
+
+def publish_region(conn, region_id):
+    # Замена данных региона, очистка его staging и отметка в checkpoint — одной транзакцией
+    with conn:
+        count = write_region(conn, region_id, staged_records(conn, region_id))
+        clear_staging(conn, region_id)
+        conn.execute(
+            'INSERT OR REPLACE INTO crawl_checkpoint (region_id, vacancies) VALUES (?, ?)', (region_id, count)
+        )
+    return count
+
+
+def publish_regions(conn, region_ids, sweep_id):
+    # Шардированный обход: все регионы одной транзакцией, бот видит обход только целиком.
+    # Номер обхода пишется в той же транзакции, поэтому повторная публикация ничего не меняет.
+    with conn:
+        # Блокировка сразу: два шарда, закончившие одновременно, не опубликуют обход дважды
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute("SELECT value FROM meta WHERE key = 'published_sweep'").fetchone()
+        if row and row[0] == sweep_id:
+            return None
+        counts = {region_id: write_region(conn, region_id, staged_records(conn, region_id)) for region_id in region_ids}
+        clear_staging(conn)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('published_sweep', ?)", (sweep_id,))
+    return counts
+
+
+def add_vacancy(conn, region_id, record, source='hh'):
+    with conn:
+        insert_vacancy(conn, region_id, record, source)
+        rebuild_region_stats(conn, region_id)
+        bump_dataset_version(conn)
+
+
+def insert_submission(conn, region_id, submission, created=None):
+    # submission: profession, salary ('от X до Y руб.') и experience в том виде, как их ввёл пользователь.
+    # Неразобранная зарплата сохраняется как текст без salary_rub и в агрегаты не попадает.
+    salary_from, salary_to = analytics.parse_salary_text(submission['salary'])
+    conn.execute(
+        'INSERT INTO submissions (region_id, profession, salary, salary_from, salary_to, currency, salary_rub, '
+        'experience, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (
+            region_id, submission['profession'], submission['salary'], salary_from, salary_to, 'RUR',
+            analytics.salary_to_rub(salary_from, salary_to, 'RUR', load_currency_rates()),
+            normalize_experience(submission.get('experience')), created or time.time(),
+        )
+    )
+
+
+def add_submissions(conn, submissions):
+    # Пачка (region_id, submission) одной транзакцией: агрегаты каждого региона пересчитываются один раз
+    with conn:
+        for region_id, submission in submissions:
+            insert_submission(conn, region_id, submission)
+        for region_id in {region_id for region_id, _ in submissions}:
+            rebuild_region_stats(conn, region_id)
+        bump_submissions_version(conn)
+
+
+def split_professions(value):
+    return [profession for profession in (value or '').split(PROFESSION_SEPARATOR) if profession]
+
+
+def as_csv_row(row):
+    # Строка в том же виде, в каком её раньше отдавал csv.DictReader, плюс числовые поля зарплаты и теги навыков
+    vacancy = {column: row[field] for column, field in CSV_COLUMNS.items()}
+    for field in SALARY_COLUMNS:
+        vacancy[field] = row[field]
+    vacancy['skills'] = row['skills'].split(SKILL_SEPARATOR) if row['skills'] else []
+    return vacancy
+
+
+def get_vacancies(conn, region_id=None, profession=None, experience=None):
+    conditions = []
+    params = [PROFESSION_SEPARATOR]
+    if region_id is not None:
+        conditions.append('v.region_id = ?')
+        params.append(region_id)
+    if profession is not None:
+        conditions.append('v.id IN (SELECT vacancy_id FROM vacancy_professions WHERE profession = ?)')
+        params.append(profession)
+    if experience is not None:
+        conditions.append('v.experience = ?')
+        params.append(normalize_experience(experience))
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+    rows = conn.execute(f'''
+        SELECT v.*, (
+            SELECT GROUP_CONCAT(profession, ?) FROM vacancy_professions WHERE vacancy_id = v.id
+        ) AS professions
+        FROM vacancies v
+        {where}
+        ORDER BY v.id
+    ''', params)
+    return [as_csv_row(row) for row in rows]
+
+
+def data_files_mtime(path=DB_PATH):
+    # При WAL изменения сначала попадают в файл -wal, поэтому смотрим оба
+    mtimes = [os.stat(filename).st_mtime for filename in (path, path + '-wal') if os.path.exists(filename)]
+    return max(mtimes, default=0.0)
+
+
+def load_dataset(path=DB_PATH):
+    # Все вакансии, агрегаты, версия данных и состояние зарплат пользователей из одного снимка базы
+    conn = connect(path)
+    try:
+        conn.execute('BEGIN')
+        version = get_dataset_version(conn)
+        submissions = get_submissions_state(conn)
+        rows = conn.execute('''
+            SELECT v.*, (
+                SELECT GROUP_CONCAT(profession, ?) FROM vacancy_professions WHERE vacancy_id = v.id
+            ) AS professions
+            FROM vacancies v
+            ORDER BY v.id
+        ''', (PROFESSION_SEPARATOR,))
+        vacancies = [
+            (row['region_id'], split_professions(row['professions']), as_csv_row(row))
+            for row in rows
+        ]
+        stats = [dict(row) for row in conn.execute('SELECT * FROM salary_stats')]
+        conn.execute('COMMIT')
+        return version, vacancies, stats, submissions
+    finally:
+        conn.close()
+
+
+def load_submission_stats(path=DB_PATH, after_id=0):
+    # Агрегаты регионов, куда после записи after_id добавлены зарплаты пользователей, из одного снимка базы:
+    # (версия, id последней записи, id регионов, строки salary_stats этих регионов)
+    conn = connect(path)
+    try:
+        conn.execute('BEGIN')
+        version, last_id = get_submissions_state(conn)
+        region_ids = [region_id for (region_id,) in conn.execute(
+            'SELECT DISTINCT region_id FROM submissions WHERE id > ?', (after_id,)
+        )]
+        placeholders = ', '.join('?' * len(region_ids))
+        stats = [dict(row) for row in conn.execute(
+            f'SELECT * FROM salary_stats WHERE region_id IN ({placeholders})', region_ids
+        )]
+        conn.execute('COMMIT')
+        return version, last_id, region_ids, stats
+    finally:
+        conn.close()
+
+
+def import_csv(conn, filename, region_id):
+    with open(filename, 'r', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    vacancies, submissions = {}, []
+    for row in rows:
+        record = {field: row.get(column) for column, field in CSV_COLUMNS.items()}
+        record['professions'] = split_professions(record['professions'])
+        # Строки, дописанные ботом, — без ссылки на hh.ru
+        url = record['url'] or ''
+        if not url.startswith('http'):
+            submissions.append(record)
+            continue
+        # Прежний парсер писал вакансию отдельной строкой на каждый синоним: склеиваем их профессии
+        hh_id = url.rstrip('/').rsplit('/', 1)[-1]
+        if hh_id in vacancies:
+            merged = vacancies[hh_id]['professions']
+            merged.extend(profession for profession in record['professions'] if profession not in merged)
+            continue
+        record['hh_id'] = hh_id
+        vacancies[hh_id] = record
+    with conn:
+        # CSV региона переносится целиком, поэтому повторный migrate заменяет и вакансии, и ответы пользователей
+        conn.execute('DELETE FROM vacancies WHERE region_id = ?', (region_id,))
+        conn.execute('DELETE FROM submissions WHERE region_id = ?', (region_id,))
+        bump_dataset_version(conn)
+        bump_submissions_version(conn)
+        for record in submissions:
+            for profession in record['professions']:
+                insert_submission(conn, region_id, {
+                    'profession': profession, 'salary': record['salary'], 'experience': record['experience'],
+                })
+        for record in vacancies.values():
+            record['salary_from'], record['salary_to'], record['currency'] = analytics.parse_salary(record['salary'])
+            record['skills'] = skills.extract_skills(record['requirements'])
+            insert_vacancy(conn, region_id, record, 'hh')
+        rebuild_region_stats(conn, region_id)
+    return len(vacancies)
+
+
+def migrate_csv(conn, directory='.'):
+    for filename in sorted(glob.glob(os.path.join(directory, '*_vacancies.csv'))):
+        region_id = os.path.basename(filename).split('_', 1)[0]
+        if not region_id.isdigit():
+            continue
+        count = import_csv(conn, filename, int(region_id))
+        print(f'Перенесено {count} вакансий из {filename}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Хранилище вакансий')
+    parser.add_argument('--db', default=DB_PATH, help='путь к базе SQLite')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help='перенести {region_id}_vacancies.csv в базу')
+    migrate_parser.add_argument('--dir', default='.', help='каталог с CSV-файлами')
+    subparsers.add_parser('stats', help='пересчитать агрегаты зарплат и опыта')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        if args.command == 'migrate':
+            migrate_csv(conn, args.dir)
+        elif args.command == 'stats':
+            rebuild_stats(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()